@@ -0,0 +1,52 @@
+import sys
+import json
+import time
+import timeit
+
+sys.path.append('.')
+from src.consensus.log_entry import LogEntry, encode_append_entries, decode_append_entries
+
+ENTRIES = 512
+PEERS = 2
+REPEAT = 20
+
+def make_command(i: int):
+    return {
+        "type": "ACQUIRE",
+        "lock_name": f"res_{i % 100}",
+        "lock_type": "exclusive",
+        "client_id": f"User_{1000 + i}",
+        "expiry": time.time() + 10.0
+    }
+
+COMMANDS = [make_command(i) for i in range(ENTRIES)]
+HEADER = {'term': 3, 'leader_id': 'node_lock_1', 'prev_log_index': 0, 'prev_log_term': 0, 'leader_commit': 0}
+
+def legacy_path():
+    log = [(3, json.dumps(c)) for c in COMMANDS]
+    for _ in range(PEERS):
+        body = json.dumps({**HEADER, 'entries': [json.dumps(e) for e in log]})
+        received = json.loads(body)
+        follower_log = [tuple(json.loads(e)) for e in received['entries']]
+        for _, command_str in follower_log:
+            json.loads(command_str)
+
+def encoded_path():
+    log = [LogEntry.from_command(3, c) for c in COMMANDS]
+    for _ in range(PEERS):
+        body = encode_append_entries({**HEADER, 'entries': log})
+        received = decode_append_entries(body)
+        for entry in received['entries']:
+            entry.command()
+
+def per_entry_us(fn) -> float:
+    best = min(timeit.repeat(fn, number=1, repeat=REPEAT))
+    return best / ENTRIES * 1e6
+
+if __name__ == '__main__':
+    legacy = per_entry_us(legacy_path)
+    encoded = per_entry_us(encoded_path)
+    print(f"Entries per batch: {ENTRIES}, followers: {PEERS}")
+    print(f"Legacy (term, json) tuples : {legacy:.2f} us/entry")
+    print(f"Pre-encoded LogEntry       : {encoded:.2f} us/entry")
+    print(f"Speedup                    : {legacy / encoded:.2f}x")
@@ -10,15 +10,17 @@ from typing import Dict, Any, List
 
 from src.communication.message_passing import NodeCommunication
 from src.consensus.raft import RaftNode, RaftState
+from src.consensus.wal import WriteAheadLog
+from src.consensus.log_entry import decode_append_entries
 from src.nodes.lock_manager import DistributedLockManager
+from src.nodes.lock_shards import LockShardRouter
 from src.nodes.queue_node import ConsistentHashRing, DistributedQueueNode
 from src.nodes.cache_node import DistributedCacheNode, CacheState
 
 load_dotenv()
 
 COMM = None
-RAFT_NODE = None
-LOCK_MANAGER = None
+LOCK_ROUTER = None
 QUEUE_NODE = None
 CACHE_NODE = None
 
@@ -64,19 +66,85 @@ def safe_json_load(env_var_name: str, default_val: Any = "{}"):
         sys.exit(1)
 
 
-async def create_raft_routes(raft: RaftNode, lock_mgr: DistributedLockManager):
+def format_raft_group_metrics(node_id: str, router: LockShardRouter) -> str:
+    output = ""
+    for group_id, manager in router.groups.items():
+        raft = manager.raft_node
+        labels = f'node_id="{node_id}", group="{group_id}"'
+        output += f'raft_state_info{{{labels}, raft_state="{raft.state.value}"}} 1\n'
+        output += f'raft_is_leader{{{labels}}} {1 if raft.state == RaftState.LEADER else 0}\n'
+        output += f'term{{{labels}}} {raft.current_term}\n'
+        output += f'commit_index{{{labels}}} {raft.commit_index}\n'
+        output += f'snapshot_index{{{labels}}} {raft.snapshot_index}\n'
+        output += f'log_entries{{{labels}}} {len(raft.log)}\n'
+        output += f'raft_group_is_leader{{{labels}}} {1 if raft.state == RaftState.LEADER else 0}\n'
+        output += f'raft_group_term{{{labels}}} {raft.current_term}\n'
+        output += f'raft_group_commit_index{{{labels}}} {raft.commit_index}\n'
+    return output.strip()
+
+async def stream_watch_events(ws: web.WebSocketResponse, queue: asyncio.Queue):
+    closed = asyncio.ensure_future(ws.receive())
+    try:
+        while True:
+            event = asyncio.ensure_future(queue.get())
+            await asyncio.wait({event, closed}, return_when=asyncio.FIRST_COMPLETED)
+            if not event.done():
+                event.cancel()
+                if closed.result().type in (web.WSMsgType.CLOSE, web.WSMsgType.CLOSING, web.WSMsgType.CLOSED, web.WSMsgType.ERROR):
+                    break
+                closed = asyncio.ensure_future(ws.receive())
+                continue
+
+            await ws.send_json(event.result())
+            if event.result()['event'] == 'overflow':
+                break
+    finally:
+        closed.cancel()
+        await ws.close()
+
+async def create_raft_routes(lock_mgr: LockShardRouter):
     routes = web.RouteTableDef()
 
-    @routes.post('/raft/request_vote')
+    def group_raft(request) -> RaftNode:
+        manager = lock_mgr.groups.get(request.match_info['group_id'])
+        if manager is None:
+            raise web.HTTPNotFound(text=f"Unknown raft group {request.match_info['group_id']}")
+        return manager.raft_node
+
+    @routes.post('/raft/{group_id}/request_vote')
     async def request_vote(request):
         data = await request.json()
-        response = await raft.handle_request_vote(data)
+        response = await group_raft(request).handle_request_vote(data)
+        return web.json_response(response)
+
+    @routes.post('/raft/{group_id}/pre_vote')
+    async def pre_vote(request):
+        data = await request.json()
+        response = await group_raft(request).handle_pre_vote(data)
         return web.json_response(response)
 
-    @routes.post('/raft/append_entries')
+    @routes.post('/raft/{group_id}/append_entries')
     async def append_entries(request):
+        data = decode_append_entries(await request.read())
+        response = await group_raft(request).handle_append_entries(data)
+        return web.json_response(response)
+
+    @routes.post('/raft/{group_id}/install_snapshot')
+    async def install_snapshot(request):
+        data = await request.json()
+        response = await group_raft(request).handle_install_snapshot(data)
+        return web.json_response(response)
+
+    @routes.post('/raft/{group_id}/timeout_now')
+    async def timeout_now(request):
         data = await request.json()
-        response = await raft.handle_append_entries(data)
+        response = await group_raft(request).handle_timeout_now(data)
+        return web.json_response(response)
+
+    @routes.post('/admin/transfer_leadership')
+    async def transfer_leadership_handler(request):
+        data = await request.json() if request.can_read_body else {}
+        response = await lock_mgr.transfer_leadership(data.get('group_id'), data.get('target_id'))
         return web.json_response(response)
 
     @routes.post('/lock/acquire')
@@ -87,26 +155,126 @@ async def create_raft_routes(raft: RaftNode, lock_mgr: DistributedLockManager):
             lock_name=data['lock_name'],
             lock_type=data.get('lock_type', 'exclusive'),
             client_id=client_id,
-            timeout=data.get('timeout', 10.0)
+            timeout=data.get('timeout', 10.0),
+            forwarded=data.get('forwarded', False),
+            wait=data.get('wait', False),
+            session_id=data.get('session_id')
         )
         return web.json_response(response)
         
+    @routes.post('/lock/acquire_many')
+    async def acquire_many_handler(request):
+        data = await request.json()
+        response = await lock_mgr.acquire_many(
+            locks=data['locks'],
+            client_id=data.get('client_id', str(uuid.uuid4())),
+            timeout=data.get('timeout', 10.0),
+            forwarded=data.get('forwarded', False),
+            session_id=data.get('session_id')
+        )
+        return web.json_response(response)
+
+    @routes.post('/lock/release_many')
+    async def release_many_handler(request):
+        data = await request.json()
+        response = await lock_mgr.release_many(data['lock_names'], data['client_id'], forwarded=data.get('forwarded', False))
+        return web.json_response(response)
+
     @routes.post('/lock/release')
     async def release_lock_handler(request):
         data = await request.json()
-        response = await lock_mgr.release_lock(data['lock_name'], data['client_id'])
+        response = await lock_mgr.release_lock(data['lock_name'], data['client_id'], forwarded=data.get('forwarded', False))
+        return web.json_response(response)
+
+    @routes.post('/session/open')
+    async def open_session_handler(request):
+        data = await request.json()
+        response = await lock_mgr.open_session(
+            client_id=data.get('client_id', str(uuid.uuid4())),
+            ttl=data.get('ttl', 10.0),
+            forwarded=data.get('forwarded', False),
+            group_id=data.get('group_id'),
+            session_id=data.get('session_id')
+        )
+        return web.json_response(response)
+
+    @routes.post('/session/keepalive')
+    async def keepalive_handler(request):
+        data = await request.json()
+        response = await lock_mgr.keep_alive(data['session_id'], data.get('forwarded', False), data.get('group_id'))
+        return web.json_response(response)
+
+    @routes.post('/session/close')
+    async def close_session_handler(request):
+        data = await request.json()
+        response = await lock_mgr.close_session(data['session_id'], data.get('forwarded', False), data.get('group_id'))
+        return web.json_response(response)
+
+    @routes.get('/lock/status')
+    async def lock_status_handler(request):
+        response = await lock_mgr.get_lock_status(request.query['lock_name'], forwarded=request.query.get('forwarded') == 'true')
         return web.json_response(response)
 
+    @routes.get('/lock/holders')
+    async def lock_holders_handler(request):
+        response = await lock_mgr.list_holders(request.query['lock_name'], forwarded=request.query.get('forwarded') == 'true')
+        return web.json_response(response)
+
+    @routes.get('/lock/list')
+    async def lock_list_handler(request):
+        prefix = request.query.get('prefix', '')
+        group_id = request.query.get('group_id')
+        if group_id in lock_mgr.groups:
+            response = await lock_mgr.groups[group_id].list_locks(prefix)
+        else:
+            response = await lock_mgr.list_locks(prefix)
+        return web.json_response(response)
+
+    @routes.get('/lock/watch')
+    async def lock_watch_handler(request):
+        lock_names = request.query.getall('lock_name', [])
+        prefixes = request.query.getall('prefix', [])
+        if not lock_names and not prefixes:
+            return web.json_response({"success": False, "error": "NO_WATCH_TARGET"}, status=400)
+        try:
+            since = {group_id: int(index) for group_id, _, index in (value.partition(':') for value in request.query.getall('since', []))}
+        except ValueError:
+            return web.json_response({"success": False, "error": "INVALID_SINCE"}, status=400)
+
+        queue = lock_mgr.watch(lock_names, prefixes)
+        try:
+            ws = web.WebSocketResponse(heartbeat=15.0)
+            if ws.can_prepare(request).ok:
+                await ws.prepare(request)
+                await stream_watch_events(ws, queue)
+                return ws
+
+            events = lock_mgr.events_since(since, lock_names, prefixes)
+            if events is None:
+                return web.json_response({"success": True, "events": [], "resync": True, "cursor": lock_mgr.watch_cursor(lock_names, prefixes)})
+            if not events:
+                try:
+                    events = [await asyncio.wait_for(queue.get(), timeout=float(request.query.get('wait_ms', 30000)) / 1000)]
+                except asyncio.TimeoutError:
+                    pass
+            while not queue.empty():
+                events.append(queue.get_nowait())
+            events = [event for event in events if event.get('index', 0) > since.get(event['group_id'], -1) or 'index' not in event]
+            return web.json_response({"success": True, "events": events, "cursor": lock_mgr.watch_cursor(lock_names, prefixes)})
+        finally:
+            lock_mgr.unwatch(queue)
+
     @routes.get('/metrics')
     async def get_lock_metrics(request):
+        rafts = lock_mgr.raft_nodes()
+        led = sum(1 for raft in rafts if raft.state == RaftState.LEADER)
         metrics = {
-            'node_id': raft.node_id, 
-            'state': raft.state.value,
-            'term': raft.current_term,
-            'commit_index': raft.commit_index,
-            'is_leader': str(raft.state == RaftState.LEADER)
+            'node_id': rafts[0].node_id, 
+            'raft_groups': len(rafts),
+            'raft_groups_led': led
         }
-        return web.Response(text=format_prometheus(metrics), content_type="text/plain; version=0.0.4")
+        text = format_prometheus(metrics) + "\n" + format_raft_group_metrics(rafts[0].node_id, lock_mgr)
+        return web.Response(text=text, content_type="text/plain; version=0.0.4")
 
     return routes
 
@@ -122,7 +290,7 @@ async def create_queue_routes(queue: DistributedQueueNode):
     @routes.post('/queue/consume')
     async def consume_handler(request):
         data = await request.json()
-        response = await queue.consume(data['topic'])
+        response = await queue.consume(data['topic'], int(data.get('wait_ms', 0)))
         return web.json_response(response)
 
     @routes.post('/queue/ack')
@@ -130,7 +298,30 @@ async def create_queue_routes(queue: DistributedQueueNode):
         data = await request.json()
         response = await queue.acknowledge(data['topic'], data['message_id'])
         return web.json_response(response)
-        
+
+    @routes.post('/queue/publish_batch')
+    async def publish_batch_handler(request):
+        data = await request.json()
+        response = await queue.publish_batch(data['topic'], data['messages'])
+        return web.json_response(response)
+
+    @routes.post('/queue/consume_batch')
+    async def consume_batch_handler(request):
+        data = await request.json()
+        response = await queue.consume_batch(data['topic'], int(data.get('count', 100)), int(data.get('wait_ms', 0)))
+        return web.json_response(response)
+
+    @routes.post('/queue/ack_batch')
+    async def acknowledge_batch_handler(request):
+        data = await request.json()
+        response = await queue.acknowledge_batch(data['topic'], data['message_ids'])
+        return web.json_response(response)
+
+    @routes.get('/queue/pending')
+    async def pending_handler(request):
+        response = await queue.pending_info(request.query['topic'], request.query.get('message_id'))
+        return web.json_response(response)
+
     @routes.get('/metrics')
     async def get_queue_metrics(request):
         metrics = {'node_id': queue.node_id, 'status': 'ready'}
@@ -168,7 +359,7 @@ async def create_cache_routes(cache: DistributedCacheNode):
 
 
 async def init_app():
-    global COMM, RAFT_NODE, LOCK_MANAGER, QUEUE_NODE, CACHE_NODE
+    global COMM, LOCK_ROUTER, QUEUE_NODE, CACHE_NODE
     
     app = web.Application()
     NODE_ID = os.getenv("NODE_ID")
@@ -178,18 +369,31 @@ async def init_app():
     if NODE_TYPE == 'lock':
         PEERS = safe_json_load("RAFT_PEERS")
         COMM = NodeCommunication(NODE_ID, PEERS)
-        LOCK_MANAGER = DistributedLockManager(None) 
-        RAFT_NODE = RaftNode(NODE_ID, list(PEERS.keys()), COMM, LOCK_MANAGER)
-        LOCK_MANAGER.raft_node = RAFT_NODE
-        app.add_routes(await create_raft_routes(RAFT_NODE, LOCK_MANAGER))
-        asyncio.create_task(RAFT_NODE.start())
-        asyncio.create_task(LOCK_MANAGER.deadlock_monitor())
-        print(f"Running Lock Node: {NODE_ID}")
+        RAFT_DATA_DIR = os.getenv("RAFT_DATA_DIR")
+        LEASE_READS = os.getenv("RAFT_LEASE_READS", "false").lower() in ("1", "true", "yes")
+        LOCK_GROUPS = {}
+        for group_id in LockShardRouter.group_ids(int(os.getenv("RAFT_GROUPS") or 1)):
+            manager = DistributedLockManager(None)
+            manager.group_id = group_id
+            storage = WriteAheadLog(os.path.join(RAFT_DATA_DIR, NODE_ID, group_id)) if RAFT_DATA_DIR else None
+            raft = RaftNode(NODE_ID, list(PEERS.keys()), COMM, manager, storage)
+            raft.rpc_prefix = f"/raft/{group_id}"
+            raft.preferred_leader = LockShardRouter.preferred_leader(group_id, list(PEERS.keys())) == NODE_ID
+            raft.lease_reads = LEASE_READS
+            manager.raft_node = raft
+            LOCK_GROUPS[group_id] = manager
+        LOCK_ROUTER = LockShardRouter(LOCK_GROUPS)
+        app.add_routes(await create_raft_routes(LOCK_ROUTER))
+        for raft in LOCK_ROUTER.raft_nodes():
+            asyncio.create_task(raft.start())
+        asyncio.create_task(LOCK_ROUTER.deadlock_monitor())
+        print(f"Running Lock Node: {NODE_ID} with {len(LOCK_GROUPS)} raft group(s)")
 
     elif NODE_TYPE == 'queue':
         QUEUE_NODES = safe_json_load("QUEUE_NODES", default_val="[]")
         ring = ConsistentHashRing(QUEUE_NODES)
-        QUEUE_NODE = DistributedQueueNode(NODE_ID, ring, REDIS_HOST)
+        QUEUE_NODE = DistributedQueueNode(NODE_ID, ring, REDIS_HOST, max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS") or 50),
+                                          engine=os.getenv("QUEUE_ENGINE") or 'list')
         app.add_routes(await create_queue_routes(QUEUE_NODE))
         asyncio.create_task(QUEUE_NODE.redelivery_monitor())
         print(f"Running Queue Node: {NODE_ID}")
@@ -9,14 +9,31 @@ class NodeCommunication:
         self.peers = peers
         self.session = aiohttp.ClientSession()
 
-    async def send_rpc(self, target_id: str, endpoint: str, payload: Dict[str, Any]):
+    async def send_rpc(self, target_id: str, endpoint: str, payload: Dict[str, Any], timeout: float = 0.5):
         if target_id not in self.peers:
             return {'success': False, 'error': 'Peer not found'}
         
-        url = f"{self.peers[target_id]}{endpoint}"
-        
+        return await self._post(f"{self.peers[target_id]}{endpoint}", timeout, json=payload)
+
+    async def send_raw_rpc(self, target_id: str, endpoint: str, body: bytes, timeout: float = 0.5):
+        if target_id not in self.peers:
+            return {'success': False, 'error': 'Peer not found'}
+
+        headers = {'Content-Type': 'application/octet-stream'}
+        return await self._post(f"{self.peers[target_id]}{endpoint}", timeout, data=body, headers=headers)
+
+    async def send_get_rpc(self, target_id: str, endpoint: str, params: Dict[str, Any], timeout: float = 0.5):
+        if target_id not in self.peers:
+            return {'success': False, 'error': 'Peer not found'}
+
+        return await self._request('GET', f"{self.peers[target_id]}{endpoint}", timeout, params=params)
+
+    async def _post(self, url: str, timeout: float, **kwargs):
+        return await self._request('POST', url, timeout, **kwargs)
+
+    async def _request(self, method: str, url: str, timeout: float, **kwargs):
         try:
-            async with self.session.post(url, json=payload, timeout=0.5) as response: 
+            async with self.session.request(method, url, timeout=timeout, **kwargs) as response: 
                 if response.status == 200:
                     return await response.json()
                 else:
@@ -0,0 +1,55 @@
+import json
+import struct
+from typing import List, Dict, Any
+
+FRAME_HEADER = struct.Struct('<I')
+ENTRY_HEADER = struct.Struct('<QI')
+
+class LogEntry:
+    __slots__ = ('term', 'payload')
+
+    def __init__(self, term: int, payload: bytes):
+        self.term = term
+        self.payload = payload
+
+    @classmethod
+    def from_command(cls, term: int, command: Dict[str, Any]) -> 'LogEntry':
+        return cls(term, json.dumps(command, separators=(',', ':')).encode('utf-8'))
+
+    def command(self) -> Dict[str, Any]:
+        return json.loads(self.payload)
+
+    def encoded_size(self) -> int:
+        return ENTRY_HEADER.size + len(self.payload)
+
+    def __eq__(self, other):
+        return isinstance(other, LogEntry) and self.term == other.term and self.payload == other.payload
+
+    def __repr__(self):
+        return f"LogEntry(term={self.term}, payload={self.payload!r})"
+
+def encode_append_entries(payload: Dict[str, Any]) -> bytes:
+    header = {key: value for key, value in payload.items() if key != 'entries'}
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    parts = [FRAME_HEADER.pack(len(header_bytes)), header_bytes]
+    for entry in payload.get('entries', []):
+        parts.append(ENTRY_HEADER.pack(entry.term, len(entry.payload)))
+        parts.append(entry.payload)
+    return b''.join(parts)
+
+def decode_append_entries(body: bytes) -> Dict[str, Any]:
+    view = memoryview(body)
+    (header_len,) = FRAME_HEADER.unpack_from(view, 0)
+    offset = FRAME_HEADER.size + header_len
+    payload = json.loads(bytes(view[FRAME_HEADER.size:offset]))
+
+    entries: List[LogEntry] = []
+    size = len(body)
+    while offset < size:
+        term, length = ENTRY_HEADER.unpack_from(view, offset)
+        start = offset + ENTRY_HEADER.size
+        offset = start + length
+        entries.append(LogEntry(term, body[start:offset]))
+
+    payload['entries'] = entries
+    return payload
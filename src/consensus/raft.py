@@ -1,18 +1,30 @@
 import random
 import time
+import bisect
 import json
 import asyncio
 from enum import Enum
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Optional, Any, Set
 from src.communication.message_passing import NodeCommunication
+from src.consensus.wal import WriteAheadLog
+from src.consensus.log_entry import LogEntry, encode_append_entries
 
 class RaftState(Enum):
     FOLLOWER = 'follower'
     CANDIDATE = 'candidate'
     LEADER = 'leader'
 
+class ProposalDroppedError(Exception):
+    pass
+
+class ReplicationMode(Enum):
+    PROBE = 'probe'
+    PIPELINE = 'pipeline'
+    BACKOFF = 'backoff'
+    SNAPSHOT = 'snapshot'
+
 class RaftNode:
-    def __init__(self, node_id: str, peers: List[str], comm: NodeCommunication, lock_manager):
+    def __init__(self, node_id: str, peers: List[str], comm: NodeCommunication, lock_manager, storage: Optional[WriteAheadLog] = None):
         self.node_id = node_id
         self.peers = peers
         self.comm = comm
@@ -20,28 +32,127 @@ class RaftNode:
         self.state = RaftState.FOLLOWER
         self.current_term = 0
         self.voted_for: Optional[str] = None
-        self.log: List[Tuple[int, str]] = []
+        self.log: List[LogEntry] = []
+        self.snapshot_index = 0
+        self.snapshot_term = 0
+        self.snapshot_data: Optional[Dict[str, Any]] = None
+        self.snapshot_threshold = 10000
         self.commit_index = 0
         self.last_applied = 0
         self.leader_id: Optional[str] = None
         
         self.next_index: Dict[str, int] = {p: 1 for p in peers}
         self.match_index: Dict[str, int] = {p: 0 for p in peers}
+        self.replication_mode: Dict[str, ReplicationMode] = {p: ReplicationMode.PROBE for p in peers}
+        self._replicators: Dict[str, Tuple[int, asyncio.Task]] = {}
+        self._replicate_events: Dict[str, asyncio.Event] = {}
+        self._commit_futures: Dict[int, Tuple[int, asyncio.Future]] = {}
+        self._leader_ready: Optional[asyncio.Future] = None
+        self._read_round: Optional[asyncio.Future] = None
+        self._peer_ack_times: Dict[str, float] = {}
+        self._transfer_target: Optional[str] = None
+        self._leadership_transfer = False
+        self._leader_since = 0.0
         
         self.heartbeat_interval = 0.1
+        self.max_batch_entries = 512
+        self.max_batch_bytes = 256 * 1024
+        self.max_inflight = 4
+        self.snapshot_rpc_timeout = 5.0
+        self.transfer_timeout = 1.0
         self.election_timeout_min = 1.0
         self.election_timeout_max = 2.5
+        self.preferred_leader = False
         self.election_timeout = self._get_random_timeout()
         self.last_contact = time.time()
         self.lock = asyncio.Lock()
+        self.lease_reads = False
+        self.clock_drift_bound = 0.1
+        self.rpc_prefix = '/raft'
+        
+        self.storage = storage
+        self.durable_index = 0
+        self._sync_scheduled = False
+        if storage is not None:
+            self._load_from_storage()
+
+    def _load_from_storage(self):
+        meta, snapshot, entries = self.storage.load()
+        self.current_term = meta['term']
+        self.voted_for = meta['voted_for']
+        
+        if snapshot:
+            self.snapshot_index = snapshot['index']
+            self.snapshot_term = snapshot['term']
+            self.snapshot_data = snapshot['data']
+            self.lock_manager.restore_snapshot(snapshot['data'])
+            self.commit_index = self.snapshot_index
+            self.last_applied = self.snapshot_index
+        
+        self.log = entries
+        self.durable_index = self._last_log_index()
+        print(f"Node {self.node_id}: Recovered term {self.current_term}, snapshot {self.snapshot_index}, {len(self.log)} log entries")
+
+    async def _persist_state(self):
+        if self.storage is not None:
+            await self.storage.save_meta(self.current_term, self.voted_for)
+
+    def _schedule_sync(self):
+        if self.storage is None or self._sync_scheduled:
+            return
+        self._sync_scheduled = True
+        asyncio.ensure_future(self._sync_storage())
+
+    async def _sync_storage(self):
+        self._sync_scheduled = False
+        target = self._last_log_index()
+        await self.storage.sync()
+        self.durable_index = max(self.durable_index, target)
+        
+        if self.state == RaftState.LEADER:
+            await self._check_for_new_commits()
+
+    def _durable_last_index(self) -> int:
+        if self.storage is None:
+            return self._last_log_index()
+        return min(self.durable_index, self._last_log_index())
         
     def _get_random_timeout(self) -> float:
+        if self.preferred_leader:
+            return random.uniform(self.election_timeout_min / 2, self.election_timeout_min)
         return random.uniform(self.election_timeout_min, self.election_timeout_max)
+
+    def _last_log_index(self) -> int:
+        return self.snapshot_index + len(self.log)
+
+    def _last_log_term(self) -> int:
+        return self.log[-1].term if self.log else self.snapshot_term
+
+    def _term_at(self, index: int) -> int:
+        if index == self.snapshot_index:
+            return self.snapshot_term
+        if index < self.snapshot_index or index > self._last_log_index():
+            return -1
+        return self.log[index - self.snapshot_index - 1].term
+
+    def _first_index_of_term(self, term: int) -> int:
+        pos = bisect.bisect_left(self.log, term, key=lambda e: e.term)
+        return self.snapshot_index + pos + 1
+
+    def _last_index_of_term(self, term: int) -> int:
+        pos = bisect.bisect_right(self.log, term, key=lambda e: e.term)
+        if pos > 0 and self.log[pos - 1].term == term:
+            return self.snapshot_index + pos
+        if pos == 0 and self.snapshot_term == term:
+            return self.snapshot_index
+        return 0
         
     async def start(self):
+        self.election_timeout = self._get_random_timeout()
         while True:
             if self.state == RaftState.FOLLOWER and time.time() - self.last_contact > self.election_timeout:
-                await self._transition_to_candidate()
+                if await self._run_pre_vote():
+                    await self._transition_to_candidate()
             elif self.state == RaftState.CANDIDATE:
                 await self._run_election()
             elif self.state == RaftState.LEADER:
@@ -53,30 +164,57 @@ class RaftNode:
         self.state = RaftState.CANDIDATE
         self.current_term += 1
         self.voted_for = self.node_id
+        await self._persist_state()
         self.last_contact = time.time()
         self.election_timeout = self._get_random_timeout()
         self.leader_id = None
         print(f"Node {self.node_id}: Starting election for term {self.current_term}")
 
-    async def _run_election(self):
-        self.current_term += 1
-        self.voted_for = self.node_id
+    async def _run_pre_vote(self) -> bool:
+        payload = {
+            'term': self.current_term + 1,
+            'candidate_id': self.node_id,
+            'last_log_index': self._last_log_index(),
+            'last_log_term': self._last_log_term()
+        }
+        results = await self.comm.broadcast_rpc(f'{self.rpc_prefix}/pre_vote', payload)
+        
+        if self.state != RaftState.FOLLOWER or time.time() - self.last_contact <= self.election_timeout:
+            return False
+        
         votes_received = 1
-        self.last_contact = time.time()
+        for peer_id, result in results.items():
+            if not isinstance(result, dict) or result.get('error'):
+                continue
+            if result.get('term', 0) > self.current_term:
+                await self._step_down(result['term'])
+                return False
+            if result.get('vote_granted'):
+                votes_received += 1
         
-        print(f"Node {self.node_id}: Starting election for term {self.current_term}")
+        if votes_received >= len(self.peers) // 2 + 1:
+            return True
+        
+        self.last_contact = time.time()
+        self.election_timeout = self._get_random_timeout()
+        return False
 
-        last_log_index = len(self.log)
-        last_log_term = self.log[-1][0] if self.log else 0
+    async def _run_election(self):
+        votes_received = 1
+        term = self.current_term
+        last_log_index = self._last_log_index()
+        last_log_term = self._last_log_term()
         
         payload = {
             'term': self.current_term,
             'candidate_id': self.node_id,
             'last_log_index': last_log_index,
-            'last_log_term': last_log_term
+            'last_log_term': last_log_term,
+            'leadership_transfer': self._leadership_transfer
         }
+        self._leadership_transfer = False
         
-        results = await self.comm.broadcast_rpc('/raft/request_vote', payload)
+        results = await self.comm.broadcast_rpc(f'{self.rpc_prefix}/request_vote', payload)
         
         for peer_id, result in results.items():
             if not isinstance(result, dict) or result.get('error'):
@@ -89,65 +227,279 @@ class RaftNode:
             if result.get('vote_granted'):
                 votes_received += 1
         
+        if self.state != RaftState.CANDIDATE or self.current_term != term:
+            return
+        
         if votes_received >= len(self.peers) // 2 + 1:
             await self._transition_to_leader()
             return
             
         await asyncio.sleep(self.election_timeout)
+        if self.state == RaftState.CANDIDATE and self.current_term == term:
+            self.state = RaftState.FOLLOWER
 
     async def _leader_loop(self):
-        tasks = []
-        
         for peer_id in self.peers:
             if peer_id == self.node_id:
                 continue
             
-            next_idx = self.next_index.get(peer_id, 1)
-            prev_log_index = next_idx - 1
+            replicator = self._replicators.get(peer_id)
+            if replicator is None or replicator[0] != self.current_term or replicator[1].done():
+                task = asyncio.create_task(self._replicate_to_peer(peer_id, self.current_term))
+                self._replicators[peer_id] = (self.current_term, task)
+        
+        await self._check_for_new_commits()
+        if not self._check_quorum():
+            print(f"Node {self.node_id} (Leader): Lost contact with quorum in term {self.current_term}. Stepping down.")
+            self.state = RaftState.FOLLOWER
+            self.leader_id = None
+            self.last_contact = time.time()
+            self._transfer_target = None
+            return
+        await asyncio.sleep(self.heartbeat_interval)
+
+    async def _replicate_to_peer(self, peer_id: str, term: int):
+        inflight: Set[asyncio.Task] = set()
+        last_sent = 0.0
+        wake = self._replicate_events.setdefault(peer_id, asyncio.Event())
+        
+        while self.state == RaftState.LEADER and self.current_term == term:
+            wake.clear()
+            mode = self.replication_mode.get(peer_id, ReplicationMode.PROBE)
+            heartbeat_due = time.time() - last_sent >= self.heartbeat_interval
+            has_entries = self.next_index.get(peer_id, 1) <= self._last_log_index()
             
-            prev_log_term = self.log[prev_log_index - 1][0] if prev_log_index > 0 else 0
+            window = self.max_inflight if mode == ReplicationMode.PIPELINE else 1
+            if mode == ReplicationMode.BACKOFF:
+                can_send = not inflight and heartbeat_due
+            elif mode == ReplicationMode.SNAPSHOT:
+                can_send = not inflight
+            else:
+                can_send = len(inflight) < window and (has_entries or heartbeat_due)
             
-            entries_to_send = self.log[prev_log_index:]
+            if can_send:
+                if self.next_index.get(peer_id, 1) <= self.snapshot_index:
+                    self.replication_mode[peer_id] = ReplicationMode.SNAPSHOT
+                    task = asyncio.create_task(self._send_install_snapshot(peer_id, self._build_install_snapshot()))
+                else:
+                    payload, count = self._build_append_entries(peer_id, probe=mode == ReplicationMode.BACKOFF)
+                    self.next_index[peer_id] = payload['prev_log_index'] + count + 1
+                    task = asyncio.create_task(self._send_append_entries(peer_id, payload, count))
+                
+                inflight.add(task)
+                task.add_done_callback(inflight.discard)
+                task.add_done_callback(lambda _: wake.set())
+                last_sent = time.time()
+                continue
             
-            payload = {
-                'term': self.current_term,
+            wait_time = max(0.0, self.heartbeat_interval - (time.time() - last_sent))
+            timeout = None if inflight and len(inflight) >= window else wait_time
+            waiter = asyncio.ensure_future(wake.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=timeout)
+            finally:
+                waiter.cancel()
+
+    def _wake_replicators(self):
+        for event in self._replicate_events.values():
+            event.set()
+
+    def _build_append_entries(self, peer_id: str, probe: bool = False) -> Tuple[Dict[str, Any], int]:
+        next_idx = self.next_index.get(peer_id, 1)
+        prev_log_index = next_idx - 1
+        prev_log_term = self._term_at(prev_log_index)
+        
+        entries: List[LogEntry] = []
+        batch_bytes = 0
+        start = prev_log_index - self.snapshot_index
+        limit = 0 if probe else self.max_batch_entries
+        for entry in self.log[start:start + limit]:
+            entry_size = entry.encoded_size()
+            if entries and batch_bytes + entry_size > self.max_batch_bytes:
+                break
+            entries.append(entry)
+            batch_bytes += entry_size
+        
+        payload = {
+            'term': self.current_term,
+            'leader_id': self.node_id,
+            'prev_log_index': prev_log_index,
+            'prev_log_term': prev_log_term,
+            'entries': entries,
+            'leader_commit': self.commit_index
+        }
+        return payload, len(entries)
+
+    async def _send_append_entries(self, peer_id: str, payload: Dict[str, Any], count: int):
+        sent_at = time.monotonic()
+        result = await self._send_append_rpc(peer_id, payload)
+        
+        if self.state != RaftState.LEADER or self.current_term != payload['term']:
+            return
+        
+        prev_log_index = payload['prev_log_index']
+        match_index = self.match_index.get(peer_id, 0)
+        
+        if not isinstance(result, dict) or result.get('error'):
+            self.replication_mode[peer_id] = ReplicationMode.BACKOFF
+            self.next_index[peer_id] = max(match_index + 1, min(self.next_index[peer_id], prev_log_index + 1))
+            return
+        
+        if result.get('term', 0) > self.current_term:
+            await self._step_down(result['term'])
+            return
+        
+        self._record_ack(peer_id, sent_at)
+        
+        if result.get('success'):
+            new_match_index = prev_log_index + count
+            if new_match_index > match_index:
+                self.match_index[peer_id] = new_match_index
+            self.next_index[peer_id] = max(self.next_index[peer_id], new_match_index + 1)
+            self.replication_mode[peer_id] = ReplicationMode.PIPELINE
+            await self._check_for_new_commits()
+        else:
+            self.replication_mode[peer_id] = ReplicationMode.PROBE
+            retry_index = self._next_index_from_conflict(result, prev_log_index)
+            self.next_index[peer_id] = max(match_index + 1, min(self.next_index[peer_id], retry_index))
+
+    def _next_index_from_conflict(self, result: Dict[str, Any], prev_log_index: int) -> int:
+        conflict_index = result.get('conflict_index')
+        if conflict_index is None:
+            return prev_log_index
+        
+        conflict_term = result.get('conflict_term')
+        if conflict_term is not None:
+            last_index = self._last_index_of_term(conflict_term)
+            if last_index > 0:
+                return last_index + 1
+        return conflict_index
+
+    async def _send_append_rpc(self, peer_id: str, payload: Dict[str, Any]):
+        return await self.comm.send_raw_rpc(peer_id, f'{self.rpc_prefix}/append_entries', encode_append_entries(payload))
+
+    def _build_install_snapshot(self) -> Dict[str, Any]:
+        return {
+            'term': self.current_term,
+            'leader_id': self.node_id,
+            'last_included_index': self.snapshot_index,
+            'last_included_term': self.snapshot_term,
+            'data': self.snapshot_data
+        }
+
+    async def _send_install_snapshot(self, peer_id: str, payload: Dict[str, Any]):
+        result = await self.comm.send_rpc(peer_id, f'{self.rpc_prefix}/install_snapshot', payload, timeout=self.snapshot_rpc_timeout)
+        
+        if self.state != RaftState.LEADER or self.current_term != payload['term']:
+            return
+        
+        if not isinstance(result, dict) or result.get('error'):
+            self.replication_mode[peer_id] = ReplicationMode.BACKOFF
+            return
+        
+        if result.get('term', 0) > self.current_term:
+            await self._step_down(result['term'])
+            return
+        
+        last_included_index = payload['last_included_index']
+        if last_included_index > self.match_index.get(peer_id, 0):
+            self.match_index[peer_id] = last_included_index
+        self.next_index[peer_id] = max(self.next_index.get(peer_id, 1), last_included_index + 1)
+        self.replication_mode[peer_id] = ReplicationMode.PROBE
+        print(f"Node {self.node_id} (Leader): Installed snapshot at {last_included_index} on {peer_id}")
+        await self._check_for_new_commits()
+
+    def _record_ack(self, peer_id: str, sent_at: float):
+        if sent_at > self._peer_ack_times.get(peer_id, 0.0):
+            self._peer_ack_times[peer_id] = sent_at
+
+    def _quorum_ack_time(self) -> float:
+        others = [p for p in self.peers if p != self.node_id]
+        needed = (len(others) + 1) // 2
+        if needed == 0:
+            return time.monotonic()
+        
+        acks = sorted((self._peer_ack_times.get(p, 0.0) for p in others), reverse=True)
+        return acks[needed - 1]
+
+    def _lease_valid(self) -> bool:
+        lease_duration = self.election_timeout_min * (1 - self.clock_drift_bound)
+        return time.monotonic() < self._quorum_ack_time() + lease_duration
+
+    def _check_quorum(self) -> bool:
+        quorum_contact = max(self._quorum_ack_time(), self._leader_since)
+        return time.monotonic() - quorum_contact <= self.election_timeout_max
+
+    async def read_index(self) -> Tuple[bool, Optional[str]]:
+        if self.state != RaftState.LEADER or self._leader_ready is None:
+            return (False, self.leader_id)
+        
+        term = self.current_term
+        try:
+            await asyncio.wait_for(asyncio.shield(self._leader_ready), timeout=self.election_timeout_min)
+        except (ProposalDroppedError, asyncio.TimeoutError):
+            return (False, self.leader_id)
+        
+        if not (self.lease_reads and self._transfer_target is None and self._lease_valid()):
+            if not await self._confirm_leadership():
+                return (False, self.leader_id)
+        
+        if self.state != RaftState.LEADER or self.current_term != term:
+            return (False, self.leader_id)
+        return (True, None)
+
+    async def _confirm_leadership(self) -> bool:
+        if self._read_round is None:
+            self._read_round = asyncio.get_running_loop().create_future()
+            asyncio.ensure_future(self._run_read_round(self._read_round))
+        return await asyncio.shield(self._read_round)
+
+    async def _run_read_round(self, round_future: asyncio.Future):
+        self._read_round = None
+        term = self.current_term
+        others = [p for p in self.peers if p != self.node_id]
+        sent_at = time.monotonic()
+        
+        payloads = []
+        for peer_id in others:
+            prev_log_index = max(self.match_index.get(peer_id, 0), self.snapshot_index)
+            payloads.append({
+                'term': term,
                 'leader_id': self.node_id,
                 'prev_log_index': prev_log_index,
-                'prev_log_term': prev_log_term,
-                'entries': [json.dumps(e) for e in entries_to_send],
+                'prev_log_term': self._term_at(prev_log_index),
+                'entries': [],
                 'leader_commit': self.commit_index
-            }
-            
-            tasks.append(self.comm.send_rpc(peer_id, '/raft/append_entries', payload))
-
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+            })
+        
+        results = await asyncio.gather(*[self._send_append_rpc(p, payload) for p, payload in zip(others, payloads)])
         
-        for i, peer_id in enumerate([p for p in self.peers if p != self.node_id]):
-            result = results[i]
+        acks = 1
+        for peer_id, result in zip(others, results):
             if not isinstance(result, dict) or result.get('error'):
                 continue
-            
             if result.get('term', 0) > self.current_term:
                 await self._step_down(result['term'])
-                return
-            
-            if result.get('success'):
-                new_match_index = prev_log_index + len(entries_to_send)
-                self.match_index[peer_id] = new_match_index
-                self.next_index[peer_id] = new_match_index + 1
-            else:
-                self.next_index[peer_id] = max(1, self.next_index[peer_id] - 1)
+                break
+            if result.get('term') == term:
+                self._record_ack(peer_id, sent_at)
+                acks += 1
         
-        await self._check_for_new_commits()
-        await asyncio.sleep(self.heartbeat_interval)
+        confirmed = self.state == RaftState.LEADER and self.current_term == term and acks >= len(others) // 2 + 1
+        round_future.set_result(confirmed)
+
+    def _heard_from_leader_recently(self) -> bool:
+        if self.state == RaftState.LEADER:
+            return True
+        return self.leader_id is not None and time.time() - self.last_contact < self.election_timeout_min
 
     async def _check_for_new_commits(self):
-        indices = sorted([self.match_index.get(p, 0) for p in self.peers] + [len(self.log)], reverse=True)
+        indices = sorted([self.match_index.get(p, 0) for p in self.peers if p != self.node_id] + [self._durable_last_index()], reverse=True)
         
-        N = indices[len(self.peers) // 2]
+        N = indices[len(indices) // 2]
         
         if N > self.commit_index and N > 0:
-            log_term_at_N = self.log[N - 1][0]
+            log_term_at_N = self._term_at(N)
             if log_term_at_N == self.current_term:
                 self.commit_index = N
                 await self._apply_log()
@@ -157,24 +509,78 @@ class RaftNode:
         while self.last_applied < self.commit_index:
             self.last_applied += 1
             
-            log_entry_index = self.last_applied - 1
+            log_entry_index = self.last_applied - self.snapshot_index - 1
             if log_entry_index >= len(self.log):
                  break 
                  
-            term, command_str = self.log[log_entry_index]
+            entry = self.log[log_entry_index]
+            term = entry.term
             
             try:
-                command = json.loads(command_str)
-                self.lock_manager.apply_command(command) 
+                command = entry.command()
+                result = self.lock_manager.apply_command(command) 
+                self._resolve_commit_future(self.last_applied, term, result)
                 
-            except json.JSONDecodeError:
+            except json.JSONDecodeError as e:
                 print(f"ERROR: Failed to decode command log at index {self.last_applied}")
+                self._resolve_commit_future(self.last_applied, term, error=e)
             except Exception as e:
                 print(f"FATAL STATE MACHINE ERROR at {self.last_applied}: {e}")
+                self._resolve_commit_future(self.last_applied, term, error=e)
+        
+        if self.last_applied - self.snapshot_index >= self.snapshot_threshold:
+            await self._take_snapshot()
+
+    async def _take_snapshot(self):
+        index = self.last_applied
+        term = self._term_at(index)
+        
+        self.snapshot_data = self.lock_manager.snapshot()
+        self.log = self.log[index - self.snapshot_index:]
+        self.snapshot_index = index
+        self.snapshot_term = term
+        if self.storage is not None:
+            await self.storage.save_snapshot(index, term, self.snapshot_data)
+        print(f"Node {self.node_id}: Snapshot taken at index {index}, {len(self.log)} entries retained")
+
+    def _resolve_commit_future(self, index: int, term: int, result: Any = None, error: Optional[Exception] = None):
+        pending = self._commit_futures.pop(index, None)
+        if pending is None:
+            return
+        
+        proposed_term, future = pending
+        if future.done():
+            return
+        if proposed_term != term:
+            future.set_exception(ProposalDroppedError(f"Entry {index} was overwritten by term {term}"))
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _truncate_log(self, idx: int):
+        index = self.snapshot_index + idx + 1
+        self.log = self.log[:idx]
+        self._drop_commit_futures(index)
+        self.durable_index = min(self.durable_index, index - 1)
+        if self.storage is not None:
+            self.storage.truncate_from(index)
+
+    def _drop_commit_futures(self, from_index: int):
+        for index in [i for i in self._commit_futures if i >= from_index]:
+            _, future = self._commit_futures.pop(index)
+            if not future.done():
+                future.set_exception(ProposalDroppedError(f"Entry {index} was truncated"))
+
+    def _drop_commit_futures_through(self, last_index: int):
+        for index in [i for i in self._commit_futures if i <= last_index]:
+            _, future = self._commit_futures.pop(index)
+            if not future.done():
+                future.set_exception(ProposalDroppedError(f"Entry {index} was replaced by a snapshot before it was applied"))
                 
     def _log_is_at_least_up_to_date(self, candidate_last_index: int, candidate_last_term: int) -> bool:
-        last_log_index = len(self.log)
-        last_log_term = self.log[-1][0] if self.log else 0
+        last_log_index = self._last_log_index()
+        last_log_term = self._last_log_term()
         
         if candidate_last_term != last_log_term:
             return candidate_last_term >= last_log_term
@@ -186,6 +592,8 @@ class RaftNode:
         self.voted_for = None
         self.leader_id = None
         self.last_contact = time.time()
+        self._transfer_target = None
+        await self._persist_state()
         print(f"Node {self.node_id}: Stepping down to Follower, term {new_term}")
     
     async def handle_request_vote(self, payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -195,6 +603,8 @@ class RaftNode:
             
             if term < self.current_term:
                 return {'term': self.current_term, 'vote_granted': False}
+            if self._heard_from_leader_recently() and not payload.get('leadership_transfer'):
+                return {'term': self.current_term, 'vote_granted': False}
                 
             if term > self.current_term:
                 await self._step_down(term) 
@@ -204,67 +614,207 @@ class RaftNode:
             if log_ok and (self.voted_for is None or self.voted_for == candidate_id):
                 self.voted_for = candidate_id
                 self.last_contact = time.time()
+                await self._persist_state()
                 return {'term': self.current_term, 'vote_granted': True}
             else:
                 return {'term': self.current_term, 'vote_granted': False}
 
+    async def handle_pre_vote(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        async with self.lock:
+            if payload['term'] < self.current_term or self._heard_from_leader_recently():
+                return {'term': self.current_term, 'vote_granted': False}
+            
+            log_ok = self._log_is_at_least_up_to_date(payload['last_log_index'], payload['last_log_term'])
+            return {'term': self.current_term, 'vote_granted': log_ok}
+
     async def handle_append_entries(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         async with self.lock:
-            term = payload['term']
-            leader_id = payload['leader_id']
+            response = await self._append_entries_locked(payload)
+        
+        if response['success'] and self.storage is not None:
+            target = self._last_log_index()
+            await self.storage.sync()
+            self.durable_index = max(self.durable_index, target)
+        return response
 
-            if term < self.current_term:
-                return {'term': self.current_term, 'success': False}
+    async def _append_entries_locked(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        term = payload['term']
+        leader_id = payload['leader_id']
+
+        if term < self.current_term:
+            return {'term': self.current_term, 'success': False}
+            
+        if term >= self.current_term:
+            if term > self.current_term:
+                await self._step_down(term)
+            self.state = RaftState.FOLLOWER
+            self.leader_id = leader_id
+            self.last_contact = time.time()
+        
+        prev_idx = payload.get('prev_log_index', 0)
+        prev_term = payload.get('prev_log_term', 0)
+        
+        if prev_idx > self._last_log_index():
+            return {'term': self.current_term, 'success': False, 'conflict_index': self._last_log_index() + 1, 'conflict_term': None}
+        
+        if prev_idx >= self.snapshot_index and self._term_at(prev_idx) != prev_term:
+            conflict_term = self._term_at(prev_idx)
+            return {'term': self.current_term, 'success': False, 'conflict_index': self._first_index_of_term(conflict_term), 'conflict_term': conflict_term}
+
+        entries: List[LogEntry] = payload.get('entries', [])
+        last_new_index = prev_idx + len(entries)
+        if entries:
+            first_new = None
+            
+            for i, entry in enumerate(entries):
+                idx = prev_idx + i - self.snapshot_index
+                if idx < 0:
+                    continue
                 
-            if term >= self.current_term:
-                if term > self.current_term:
-                    await self._step_down(term)
-                self.state = RaftState.FOLLOWER
-                self.leader_id = leader_id
-                self.last_contact = time.time()
+                if idx < len(self.log) and self.log[idx].term != entry.term:
+                    self._truncate_log(idx)
+                    self.log.append(entry)
+                elif idx >= len(self.log):
+                    self.log.append(entry)
+                else:
+                    continue
+                if first_new is None:
+                    first_new = idx
             
-            prev_idx = payload.get('prev_log_index', 0)
-            prev_term = payload.get('prev_log_term', 0)
+            if first_new is not None and self.storage is not None:
+                self.storage.append(self.snapshot_index + first_new + 1, self.log[first_new:])
+        
+        leader_commit = payload['leader_commit']
+        if leader_commit > self.commit_index:
+            new_commit_index = min(leader_commit, last_new_index)
+            if new_commit_index > self.commit_index:
+                self.commit_index = new_commit_index
+                await self._apply_log() 
+
+        return {'term': self.current_term, 'success': True}
+
+    async def handle_install_snapshot(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        async with self.lock:
+            term = payload['term']
             
-            if prev_idx > 0 and (len(self.log) < prev_idx or self.log[prev_idx-1][0] != prev_term):
+            if term < self.current_term:
                 return {'term': self.current_term, 'success': False}
+            
+            if term > self.current_term:
+                await self._step_down(term)
+            self.state = RaftState.FOLLOWER
+            self.leader_id = payload['leader_id']
+            self.last_contact = time.time()
+            
+            last_index = payload['last_included_index']
+            last_term = payload['last_included_term']
+            
+            if last_index <= self.last_applied:
+                return {'term': self.current_term, 'success': True}
+            
+            if self._term_at(last_index) == last_term:
+                self.log = self.log[last_index - self.snapshot_index:]
+            else:
+                self.log = []
+                self._drop_commit_futures(last_index + 1)
+            self._drop_commit_futures_through(last_index)
+            
+            self.snapshot_index = last_index
+            self.snapshot_term = last_term
+            self.snapshot_data = payload['data']
+            if self.storage is not None:
+                await self.storage.save_snapshot(last_index, last_term, payload['data'])
+                if not self.log:
+                    self.storage.truncate_from(last_index + 1)
+                self.durable_index = min(self.durable_index, self._last_log_index())
+            self.lock_manager.restore_snapshot(payload['data'])
+            self.commit_index = max(self.commit_index, last_index)
+            self.last_applied = last_index
+            print(f"Node {self.node_id}: Installed snapshot from {self.leader_id} at index {last_index}")
+            
+            return {'term': self.current_term, 'success': True}
 
-            entries_json = payload.get('entries', [])
-            if entries_json:
-                entries = [json.loads(e) for e in entries_json]
-                
-                start_index = prev_idx 
-                for i, (entry_term, entry_command) in enumerate(entries):
-                    idx = start_index + i
-                    
-                    if idx < len(self.log) and self.log[idx][0] != entry_term:
-                        self.log = self.log[:idx]
-                        self.log.append((entry_term, entry_command))
-                    elif idx >= len(self.log):
-                        self.log.append((entry_term, entry_command))
+    async def transfer_leadership(self, target_id: Optional[str] = None) -> Dict[str, Any]:
+        if self.state != RaftState.LEADER:
+            return {'success': False, 'error': 'NOT_LEADER', 'leader_hint': self.leader_id}
+        if self._transfer_target is not None:
+            return {'success': False, 'error': 'TRANSFER_IN_PROGRESS', 'target_id': self._transfer_target}
+        
+        others = [p for p in self.peers if p != self.node_id]
+        if target_id is None:
+            target_id = max(others, key=lambda p: self.match_index.get(p, 0), default=None)
+        if target_id not in others:
+            return {'success': False, 'error': 'INVALID_TARGET', 'target_id': target_id}
+        
+        term = self.current_term
+        self._transfer_target = target_id
+        deadline = time.monotonic() + self.transfer_timeout
+        try:
+            self._wake_replicators()
+            while self.match_index.get(target_id, 0) < self._last_log_index():
+                if self.state != RaftState.LEADER or self.current_term != term or time.monotonic() > deadline:
+                    return {'success': False, 'error': 'TRANSFER_TIMEOUT', 'target_id': target_id}
+                await asyncio.sleep(self.heartbeat_interval / 20)
+            
+            print(f"Node {self.node_id}: Transferring leadership to {target_id} at term {term}")
+            payload = {'term': term, 'leader_id': self.node_id}
+            result = await self.comm.send_rpc(target_id, f'{self.rpc_prefix}/timeout_now', payload)
+            if not isinstance(result, dict) or not result.get('success'):
+                return {'success': False, 'error': 'TIMEOUT_NOW_REJECTED', 'target_id': target_id}
             
-            leader_commit = payload['leader_commit']
-            if leader_commit > self.commit_index:
-                new_commit_index = min(leader_commit, len(self.log))
-                if new_commit_index > self.commit_index:
-                    self.commit_index = new_commit_index
-                    await self._apply_log() 
+            while self.state == RaftState.LEADER and self.current_term == term:
+                if time.monotonic() > deadline:
+                    return {'success': False, 'error': 'TRANSFER_TIMEOUT', 'target_id': target_id}
+                await asyncio.sleep(self.heartbeat_interval / 20)
+            return {'success': True, 'target_id': target_id, 'leader_hint': self.leader_id or target_id}
+        finally:
+            if self.current_term == term:
+                self._transfer_target = None
 
+    async def handle_timeout_now(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        async with self.lock:
+            if payload['term'] != self.current_term or self.state != RaftState.FOLLOWER:
+                return {'term': self.current_term, 'success': False}
+            
+            await self._transition_to_candidate()
+            self._leadership_transfer = True
             return {'term': self.current_term, 'success': True}
 
     async def _transition_to_leader(self):
         self.state = RaftState.LEADER
         self.leader_id = self.node_id
-        self.next_index = {p: len(self.log) + 1 for p in self.peers}
-        self.match_index = {p: len(self.log) for p in self.peers}
+        self.next_index = {p: self._last_log_index() + 1 for p in self.peers}
+        self.match_index = {p: 0 for p in self.peers}
+        self.replication_mode = {p: ReplicationMode.PROBE for p in self.peers}
+        self._peer_ack_times = {}
+        self._transfer_target = None
+        self._leader_since = time.monotonic()
         print(f"Node {self.node_id}: Received majority votes. Becoming Leader.")
+        self._leader_ready = self._track_commit(self._append_command({"type": "NOOP"}))
+        self._leader_ready.add_done_callback(lambda f: f.cancelled() or f.exception())
         await self._leader_loop()
         
-    def submit_command(self, command: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+    def _append_command(self, command: Dict[str, Any]) -> int:
+        log_entry = LogEntry.from_command(self.current_term, command)
+        self.log.append(log_entry)
+        index = self._last_log_index()
+        if self.storage is not None:
+            self.storage.append(index, [log_entry])
+            self._schedule_sync()
+        self._wake_replicators()
+        return index
+
+    def propose(self, command: Dict[str, Any]) -> Tuple[bool, Optional[str], Optional[asyncio.Future]]:
         if self.state != RaftState.LEADER:
-            return (False, self.leader_id)
+            return (False, self.leader_id, None)
+        if self._transfer_target is not None:
+            return (False, self._transfer_target, None)
         
-        log_entry = (self.current_term, json.dumps(command))
-        self.log.append(log_entry)
+        index = self._append_command(command)
         
-        return (True, None)
\ No newline at end of file
+        return (True, None, self._track_commit(index))
+
+    def _track_commit(self, index: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._commit_futures[index] = (self.current_term, future)
+        return future
@@ -0,0 +1,199 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import asyncio
+from typing import List, Dict, Tuple, Optional, Any
+from src.consensus.log_entry import LogEntry
+
+RECORD_HEADER = struct.Struct('<BQQI')
+RECORD_CRC = struct.Struct('<I')
+
+ENTRY_RECORD = 1
+TRUNCATE_RECORD = 2
+
+class WriteAheadLog:
+    SEGMENT_PREFIX = "segment-"
+    SEGMENT_SUFFIX = ".wal"
+    META_FILE = "meta.json"
+    SNAPSHOT_FILE = "snapshot.json"
+
+    def __init__(self, directory: str, segment_max_bytes: int = 64 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+
+        self._segments: List[Tuple[int, str]] = []
+        self._next_segment_seq = 1
+        self._active = None
+        self._active_size = 0
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._sync_lock = asyncio.Lock()
+        self._json_lock = asyncio.Lock()
+
+    def _segment_path(self, seq: int, first_index: int) -> str:
+        return os.path.join(self.directory, f"{self.SEGMENT_PREFIX}{seq:010d}-{first_index:020d}{self.SEGMENT_SUFFIX}")
+
+    def _write_json_atomic(self, name: str, data: Dict[str, Any]):
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_directory()
+
+    def _read_json(self, name: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def load(self) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], List[LogEntry]]:
+        meta = self._read_json(self.META_FILE) or {'term': 0, 'voted_for': None}
+        snapshot = self._read_json(self.SNAPSHOT_FILE)
+        base_index = snapshot['index'] + 1 if snapshot else 1
+
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith(self.SEGMENT_PREFIX) and n.endswith(self.SEGMENT_SUFFIX))
+        self._segments = []
+        for name in names:
+            seq, first_index = name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)].split('-')
+            self._segments.append((int(first_index), os.path.join(self.directory, name)))
+            self._next_segment_seq = int(seq) + 1
+
+        entries: List[LogEntry] = []
+        for position, (_, path) in enumerate(self._segments):
+            valid_end, size = self._replay_segment(path, base_index, entries)
+            if valid_end < size:
+                print(f"WAL: Truncating torn tail of {path} at offset {valid_end}")
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_end)
+                    os.fsync(f.fileno())
+                for _, stale_path in self._segments[position + 1:]:
+                    os.remove(stale_path)
+                self._segments = self._segments[:position + 1]
+                break
+
+        if self._segments:
+            path = self._segments[-1][1]
+            self._active = open(path, 'ab')
+            self._active_size = os.path.getsize(path)
+
+        return meta, snapshot, entries
+
+    def _replay_segment(self, path: str, base_index: int, entries: List[LogEntry]) -> Tuple[int, int]:
+        size = os.path.getsize(path)
+        if size == 0:
+            return 0, 0
+
+        offset = 0
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            view = memoryview(buf)
+            try:
+                while offset + RECORD_HEADER.size + RECORD_CRC.size <= size:
+                    record_type, index, term, length = RECORD_HEADER.unpack_from(view, offset)
+                    payload_start = offset + RECORD_HEADER.size
+                    payload_end = payload_start + length
+                    if payload_end + RECORD_CRC.size > size:
+                        break
+
+                    (crc,) = RECORD_CRC.unpack_from(view, payload_end)
+                    if zlib.crc32(view[offset:payload_end]) != crc:
+                        break
+
+                    if record_type == ENTRY_RECORD and index >= base_index:
+                        del entries[index - base_index:]
+                        entries.append(LogEntry(term, bytes(view[payload_start:payload_end])))
+                    elif record_type == TRUNCATE_RECORD:
+                        del entries[max(0, index - base_index):]
+
+                    offset = payload_end + RECORD_CRC.size
+            finally:
+                view.release()
+
+        return offset, size
+
+    def _encode_record(self, record_type: int, index: int, term: int, payload: bytes) -> bytes:
+        header = RECORD_HEADER.pack(record_type, index, term, len(payload))
+        crc = zlib.crc32(payload, zlib.crc32(header))
+        return b''.join((header, payload, RECORD_CRC.pack(crc)))
+
+    def _write(self, first_index: int, data: bytes):
+        if self._active is None or self._active_size >= self.segment_max_bytes:
+            self._roll_segment(first_index)
+
+        self._active.write(data)
+        self._active_size += len(data)
+        self._written_seq += 1
+
+    def _roll_segment(self, first_index: int):
+        if self._active is not None:
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            self._active.close()
+
+        path = self._segment_path(self._next_segment_seq, first_index)
+        self._next_segment_seq += 1
+        self._active = open(path, 'ab')
+        self._active_size = 0
+        self._segments.append((first_index, path))
+        self._fsync_directory()
+
+    def append(self, first_index: int, entries: List[LogEntry]):
+        if not entries:
+            return
+        records = [self._encode_record(ENTRY_RECORD, first_index + i, entry.term, entry.payload) for i, entry in enumerate(entries)]
+        self._write(first_index, b''.join(records))
+
+    def truncate_from(self, index: int):
+        self._write(index, self._encode_record(TRUNCATE_RECORD, index, 0, b''))
+
+    async def sync(self):
+        target = self._written_seq
+        if self._synced_seq >= target:
+            return
+
+        async with self._sync_lock:
+            if self._synced_seq >= target or self._active is None:
+                return
+
+            seq = self._written_seq
+            self._active.flush()
+            fd = os.dup(self._active.fileno())
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, os.fsync, fd)
+            finally:
+                os.close(fd)
+            self._synced_seq = max(self._synced_seq, seq)
+
+    async def _write_json(self, name: str, data: Dict[str, Any]):
+        async with self._json_lock:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_json_atomic, name, data)
+
+    async def save_meta(self, term: int, voted_for: Optional[str]):
+        await self._write_json(self.META_FILE, {'term': term, 'voted_for': voted_for})
+
+    async def save_snapshot(self, index: int, term: int, data: Dict[str, Any]):
+        await self._write_json(self.SNAPSHOT_FILE, {'index': index, 'term': term, 'data': data})
+
+        while len(self._segments) > 1 and self._segments[1][0] <= index + 1:
+            _, path = self._segments.pop(0)
+            os.remove(path)
+
+    def close(self):
+        if self._active is not None:
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            self._active.close()
+            self._active = None
@@ -1,108 +1,732 @@
 import time
 import json
+import heapq
 import asyncio
 import uuid
-from typing import Dict, Any, Optional, List
+from collections import deque
+from functools import reduce
+from enum import Enum
+from typing import Dict, Any, Optional, List, Tuple, Set
 
-from src.consensus.raft import RaftNode, RaftState
+from src.consensus.raft import RaftNode, RaftState, ProposalDroppedError
+
+class LockOutcome(Enum):
+    GRANTED = 'granted'
+    DENIED = 'denied'
+    RELEASED = 'released'
+    NOT_HELD = 'not_held'
+    QUEUED = 'queued'
+    CANCELLED = 'cancelled'
+    ABORTED = 'aborted'
+    NO_SESSION = 'no_session'
+    SESSION_OPENED = 'session_opened'
+    SESSION_CLOSED = 'session_closed'
+
+LOCK_MODES = {'shared': 'S', 'exclusive': 'X'}
+MODE_NAMES = {'S': 'shared', 'X': 'exclusive'}
+COMPATIBLE_MODES = {
+    'IS': {'IS', 'IX', 'S', 'SIX'},
+    'IX': {'IS', 'IX'},
+    'S': {'IS', 'S'},
+    'SIX': {'IS'},
+    'X': set(),
+}
+
+def lock_mode(lock_type: str) -> str:
+    return LOCK_MODES.get(lock_type, lock_type)
+
+def combine_modes(a: str, b: str) -> str:
+    if a == b:
+        return a
+    if 'X' in (a, b):
+        return 'X'
+    if {a, b} <= {'IS', 'IX'}:
+        return 'IX'
+    if {a, b} <= {'IS', 'S'}:
+        return 'S'
+    return 'SIX'
+
+def lock_path(lock_name: str, lock_type: str) -> List[Tuple[str, str]]:
+    mode = lock_mode(lock_type)
+    intention = 'IS' if mode in ('IS', 'S') else 'IX'
+    parts = lock_name.split('/')
+    ancestors = [('/'.join(parts[:i]), intention) for i in range(1, len(parts)) if parts[i - 1]]
+    return ancestors + [(lock_name, mode)]
 
 class DistributedLockManager:
     def __init__(self, raft_node: Optional[RaftNode]):
         self.raft_node = raft_node
+        self.group_id: Optional[str] = None
         self.locks: Dict[str, Dict] = {} 
-        self.waiting_clients: Dict[str, asyncio.Event] = {}
+        self.sessions: Dict[str, Dict] = {}
+        self._grant_futures: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._waiting_on: Dict[str, Set[str]] = {}
+        self._pending_aborts: Set[Tuple[str, str]] = set()
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._session_heap: List[Tuple[float, str]] = []
+        self._pending_expiries: Dict[Tuple[str, str], float] = {}
+        self._keepalive_futures: Dict[str, asyncio.Future] = {}
+        self._keepalive_flush: Optional[asyncio.Future] = None
+        self._watchers: List[Dict[str, Any]] = []
+        self._event_history: deque = deque(maxlen=1000)
+        self._event_floor = 0
+        self.keepalive_interval = 0.2
+        self.commit_grace = 0.5
+        self.cancel_timeout = 5.0
+        self.heap_slack = 64
 
     def is_leader(self):
         return self.raft_node is not None and self.raft_node.state == RaftState.LEADER
 
-    async def acquire_lock(self, lock_name: str, lock_type: str, client_id: str, timeout: float = 10.0):
+    async def acquire_lock(self, lock_name: str, lock_type: str, client_id: str, timeout: float = 10.0, forwarded: bool = False, wait: bool = False, session_id: Optional[str] = None):
         if not self.is_leader():
-            return {"success": False, "error": "NOT_LEADER", "leader_hint": self.raft_node.leader_id}
+            payload = {"lock_name": lock_name, "lock_type": lock_type, "client_id": client_id, "timeout": timeout, "wait": wait, "session_id": session_id}
+            leader_budget = timeout + self.commit_grace + (self.cancel_timeout if wait else 0.0)
+            return await self._forward_to_leader('/lock/acquire', payload, leader_budget + 1.0, forwarded)
+        if lock_mode(lock_type) not in COMPATIBLE_MODES:
+            return {"success": False, "error": "INVALID_LOCK_TYPE"}
+        key = (lock_name, client_id)
+        if wait and key in self._grant_futures:
+            return {"success": False, "error": "ALREADY_WAITING"}
         
+        now = time.time()
         command = {
             "type": "ACQUIRE",
             "lock_name": lock_name,
             "lock_type": lock_type,
             "client_id": client_id,
-            "expiry": time.time() + timeout
+            "expiry": now + timeout,
+            "timestamp": now,
+            "wait": wait,
+            "session_id": session_id
         }
 
-        success, leader_hint = self.raft_node.submit_command(command)
-        if not success:
-            return {"success": False, "error": "SUBMIT_FAILED", "leader_hint": leader_hint}
+        grant = asyncio.get_running_loop().create_future() if wait else None
+        if grant is not None:
+            self._grant_futures[key] = grant
+        try:
+            outcome = await self._submit_and_wait(command, timeout + self.commit_grace)
+            if outcome == LockOutcome.QUEUED:
+                outcome = await self._wait_for_grant(lock_name, client_id, grant, command['expiry'] - time.time())
+        finally:
+            if self._grant_futures.get(key) is grant:
+                self._grant_futures.pop(key, None)
+        if isinstance(outcome, dict):
+            return outcome
+        
+        if outcome == LockOutcome.GRANTED:
+            return {"success": True, "message": f"{lock_type} lock acquired"}
+        if outcome == LockOutcome.NO_SESSION:
+            return {"success": False, "error": "SESSION_EXPIRED"}
+        if outcome == LockOutcome.ABORTED:
+            return {"success": False, "error": "DEADLOCK_VICTIM"}
+        return {"success": False, "error": "LOCK_DENIED"}
+
+    @staticmethod
+    def canonical_lock_set(locks: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        modes: Dict[str, str] = {}
+        for lock in locks:
+            mode = lock_mode(lock.get('lock_type', 'exclusive'))
+            modes[lock['lock_name']] = combine_modes(modes.get(lock['lock_name'], mode), mode)
+        return [{"lock_name": name, "lock_type": MODE_NAMES.get(modes[name], modes[name])} for name in sorted(modes)]
+
+    async def acquire_many(self, locks: List[Dict[str, str]], client_id: str, timeout: float = 10.0, forwarded: bool = False, session_id: Optional[str] = None):
+        if not self.is_leader():
+            payload = {"locks": locks, "client_id": client_id, "timeout": timeout, "session_id": session_id}
+            return await self._forward_to_leader('/lock/acquire_many', payload, timeout + 1.0, forwarded)
+        if any(lock_mode(lock.get('lock_type', 'exclusive')) not in COMPATIBLE_MODES for lock in locks):
+            return {"success": False, "error": "INVALID_LOCK_TYPE"}
+        
+        now = time.time()
+        command = {
+            "type": "ACQUIRE_MANY",
+            "locks": self.canonical_lock_set(locks),
+            "client_id": client_id,
+            "expiry": now + timeout,
+            "timestamp": now,
+            "session_id": session_id
+        }
+        outcome = await self._submit_and_wait(command, timeout + 0.5)
+        if isinstance(outcome, dict):
+            return outcome
+        
+        if outcome == LockOutcome.GRANTED:
+            return {"success": True, "message": f"{len(command['locks'])} locks acquired"}
+        if outcome == LockOutcome.NO_SESSION:
+            return {"success": False, "error": "SESSION_EXPIRED"}
+        return {"success": False, "error": "LOCK_DENIED"}
+
+    async def release_many(self, lock_names: List[str], client_id: str, forwarded: bool = False):
+        if not self.is_leader():
+            payload = {"lock_names": lock_names, "client_id": client_id}
+            return await self._forward_to_leader('/lock/release_many', payload, 6.0, forwarded)
+        
+        command = {"type": "RELEASE_MANY", "lock_names": sorted(set(lock_names)), "client_id": client_id, "timestamp": time.time()}
+        outcome = await self._submit_and_wait(command, 5.0)
+        if isinstance(outcome, dict):
+            return outcome
+        
+        if outcome == LockOutcome.RELEASED:
+            return {"success": True, "message": "Locks released"}
+        return {"success": False, "error": "LOCK_NOT_HELD"}
+
+    async def open_session(self, session_id: str, client_id: str, ttl: float = 10.0, forwarded: bool = False):
+        if not self.is_leader():
+            payload = {"session_id": session_id, "client_id": client_id, "ttl": ttl, "group_id": self.group_id}
+            return await self._forward_to_leader('/session/open', payload, 6.0, forwarded)
+        
+        command = {"type": "SESSION_OPEN", "session_id": session_id, "client_id": client_id, "ttl": ttl, "timestamp": time.time()}
+        outcome = await self._submit_and_wait(command, 5.0)
+        if isinstance(outcome, dict):
+            return outcome
+        return {"success": True, "session_id": session_id, "expiry": self.sessions[session_id]['expiry']}
+
+    async def keep_alive(self, session_id: str, forwarded: bool = False):
+        if not self.is_leader():
+            payload = {"session_id": session_id, "group_id": self.group_id}
+            return await self._forward_to_leader('/session/keepalive', payload, 6.0, forwarded)
+        if session_id not in self.sessions:
+            return {"success": False, "error": "SESSION_EXPIRED"}
+        
+        renewal = self._keepalive_futures.get(session_id)
+        if renewal is None:
+            renewal = asyncio.get_running_loop().create_future()
+            self._keepalive_futures[session_id] = renewal
+        if self._keepalive_flush is None:
+            self._keepalive_flush = asyncio.ensure_future(self._flush_keepalives())
+        
+        expiries = await asyncio.shield(renewal)
+        if isinstance(expiries, dict) and 'error' in expiries:
+            return expiries
+        if session_id not in expiries:
+            return {"success": False, "error": "SESSION_EXPIRED"}
+        return {"success": True, "session_id": session_id, "expiry": expiries[session_id]}
+
+    async def _flush_keepalives(self):
+        await asyncio.sleep(self.keepalive_interval)
+        renewals, self._keepalive_futures = self._keepalive_futures, {}
+        self._keepalive_flush = None
+        
+        command = {"type": "KEEPALIVE", "session_ids": sorted(renewals), "timestamp": time.time()}
+        outcome = await self._submit_and_wait(command, 5.0)
+        for renewal in renewals.values():
+            if not renewal.done():
+                renewal.set_result(outcome)
 
-        self.waiting_clients[client_id] = asyncio.Event()
+    async def close_session(self, session_id: str, forwarded: bool = False):
+        if not self.is_leader():
+            payload = {"session_id": session_id, "group_id": self.group_id}
+            return await self._forward_to_leader('/session/close', payload, 6.0, forwarded)
+        
+        command = {"type": "SESSION_CLOSE", "session_id": session_id, "timestamp": time.time()}
+        outcome = await self._submit_and_wait(command, 5.0)
+        if isinstance(outcome, dict):
+            return outcome
+        if outcome == LockOutcome.SESSION_CLOSED:
+            return {"success": True, "session_id": session_id}
+        return {"success": False, "error": "SESSION_EXPIRED"}
+
+    async def _wait_for_grant(self, lock_name: str, client_id: str, grant: asyncio.Future, timeout: float):
         try:
-            await asyncio.wait_for(self.waiting_clients[client_id].wait(), timeout=timeout + 0.5) 
-            
-            if self.locks.get(lock_name) and client_id in self.locks[lock_name]['holders']:
-                return {"success": True, "message": f"{lock_type} lock acquired"}
-            else:
-                return {"success": False, "error": "LOCK_DENIED_OR_TIMEOUT"}
+            return await asyncio.wait_for(asyncio.shield(grant), timeout=max(timeout, 0))
         except asyncio.TimeoutError:
-            return {"success": False, "error": "LOCK_TIMEOUT"}
-        finally:
-            self.waiting_clients.pop(client_id, None)
+            pass
+        
+        cancel = {"type": "CANCEL", "lock_name": lock_name, "client_id": client_id, "timestamp": time.time()}
+        outcome = await self._submit_and_wait(cancel, self.cancel_timeout)
+        if grant.done():
+            return grant.result()
+        if isinstance(outcome, dict):
+            return outcome
+        return {"success": False, "error": "LOCK_TIMEOUT"}
 
-    async def release_lock(self, lock_name: str, client_id: str):
+    async def release_lock(self, lock_name: str, client_id: str, timeout: float = 5.0, forwarded: bool = False):
         if not self.is_leader():
-            return {"success": False, "error": "NOT_LEADER", "leader_hint": self.raft_node.leader_id}
+            payload = {"lock_name": lock_name, "client_id": client_id}
+            return await self._forward_to_leader('/lock/release', payload, timeout + 1.0, forwarded)
             
-        command = {"type": "RELEASE", "lock_name": lock_name, "client_id": client_id}
-        success, leader_hint = self.raft_node.submit_command(command)
+        command = {"type": "RELEASE", "lock_name": lock_name, "client_id": client_id, "timestamp": time.time()}
+        outcome = await self._submit_and_wait(command, timeout)
+        if isinstance(outcome, dict):
+            return outcome
+        
+        if outcome == LockOutcome.RELEASED:
+            return {"success": True, "message": "Lock released"}
+        return {"success": False, "error": "LOCK_NOT_HELD"}
+
+    async def _forward_to_leader(self, endpoint: str, payload: Dict[str, Any], timeout: float, forwarded: bool):
+        leader_id = self.raft_node.leader_id
+        if forwarded or leader_id is None or leader_id == self.raft_node.node_id:
+            return {"success": False, "error": "NOT_LEADER", "leader_hint": leader_id}
+        
+        payload["forwarded"] = True
+        return await self.raft_node.comm.send_rpc(leader_id, endpoint, payload, timeout=timeout)
+
+    async def _submit_and_wait(self, command: Dict[str, Any], timeout: float):
+        success, leader_hint, commit = self.raft_node.propose(command)
+        if not success:
+            return {"success": False, "error": "SUBMIT_FAILED", "leader_hint": leader_hint}
+        
+        try:
+            return await asyncio.wait_for(commit, timeout=timeout)
+        except asyncio.TimeoutError:
+            return {"success": False, "error": "COMMIT_TIMEOUT"}
+        except ProposalDroppedError:
+            return {"success": False, "error": "LEADERSHIP_LOST", "leader_hint": self.raft_node.leader_id}
+
+    async def _read_barrier(self) -> Optional[Dict[str, Any]]:
+        if self.raft_node is None:
+            return {"success": False, "error": "NOT_LEADER", "leader_hint": None}
+
+        success, leader_hint = await self.raft_node.read_index()
+        if not success:
+            return {"success": False, "error": "NOT_LEADER", "leader_hint": leader_hint}
+        return None
+
+    def _describe_lock(self, lock_name: str) -> Dict[str, Any]:
+        lock = self.locks.get(lock_name)
+        if not lock:
+            return {"lock_name": lock_name, "held": False, "holders": []}
+        waiters = [waiter['client_id'] for waiter in lock.get('waiters', [])]
+        return {"lock_name": lock_name, "held": True, "type": lock['type'], "holders": list(lock['holders']), "modes": list(lock['modes']), "expiry": lock['expiry'], "waiters": waiters}
+
+    async def get_lock_status(self, lock_name: str):
+        error = await self._read_barrier()
+        if error:
+            return error
+        return {"success": True, **self._describe_lock(lock_name)}
+
+    async def list_holders(self, lock_name: str):
+        error = await self._read_barrier()
+        if error:
+            return error
+        lock = self.locks.get(lock_name)
+        return {"success": True, "lock_name": lock_name, "holders": list(lock['holders']) if lock else []}
+
+    async def list_locks(self, prefix: str = ""):
+        error = await self._read_barrier()
+        if error:
+            return error
+        names = sorted(name for name in self.locks if name.startswith(prefix))
+        return {"success": True, "prefix": prefix, "locks": [self._describe_lock(name) for name in names]}
+
+    def watch(self, queue: asyncio.Queue, lock_names: List[str], prefixes: List[str]):
+        self._watchers.append({'queue': queue, 'names': set(lock_names), 'prefixes': tuple(prefixes)})
+
+    def unwatch(self, queue: asyncio.Queue):
+        self._watchers = [watcher for watcher in self._watchers if watcher['queue'] is not queue]
+
+    def applied_index(self) -> int:
+        return self.raft_node.last_applied if self.raft_node is not None else 0
+
+    def events_since(self, index: int, lock_names: List[str], prefixes: List[str]) -> Optional[List[Dict[str, Any]]]:
+        if index < self._event_floor:
+            return None
+        names, prefixes = set(lock_names), tuple(prefixes)
+        return [event for event in self._event_history if event['index'] > index and (event['lock_name'] in names or event['lock_name'].startswith(prefixes))]
+
+    def _notify(self, event: str, lock_name: str, client_id: str, mode: str):
+        record = {"event": event, "lock_name": lock_name, "client_id": client_id, "mode": mode, "group_id": self.group_id, "index": self.applied_index()}
+        if len(self._event_history) == self._event_history.maxlen:
+            self._event_floor = self._event_history[0]['index']
+        self._event_history.append(record)
         
-        return {"success": success, "message": "Release command submitted"}
+        for watcher in self._watchers:
+            if lock_name not in watcher['names'] and not lock_name.startswith(watcher['prefixes']):
+                continue
+            queue = watcher['queue']
+            try:
+                queue.put_nowait(record)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"event": "overflow", "group_id": self.group_id})
+                self.unwatch(queue)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"locks": json.loads(json.dumps(self.locks)), "sessions": json.loads(json.dumps(self.sessions))}
+
+    def restore_snapshot(self, data: Dict[str, Any]):
+        self.locks = json.loads(json.dumps(data.get("locks", {})))
+        self.sessions = json.loads(json.dumps(data.get("sessions", {})))
+        self._expiry_heap = [(lock['expiry'], name) for name, lock in self.locks.items()]
+        heapq.heapify(self._expiry_heap)
+        self._session_heap = [(session['expiry'], session_id) for session_id, session in self.sessions.items()]
+        heapq.heapify(self._session_heap)
+        self._event_history.clear()
+        self._event_floor = self.raft_node.snapshot_index if self.raft_node is not None else 0
+        self._waiting_on = {}
+        for name, lock in self.locks.items():
+            lock.setdefault('modes', [lock_mode(lock['type'])] * len(lock['holders']))
+            lock.setdefault('intentions', [False] * len(lock['holders']))
+            for waiter in lock.get('waiters', []):
+                self._waiting_on.setdefault(waiter['client_id'], set()).add(name)
 
     def apply_command(self, command: Dict[str, Any]):
+        if command['type'] == 'NOOP':
+            return None
+        if command['type'] in ('ACQUIRE_MANY', 'RELEASE_MANY'):
+            return self._apply_batch_command(command)
+        if command['type'] in ('SESSION_OPEN', 'KEEPALIVE', 'SESSION_CLOSE', 'SESSION_EXPIRE'):
+            return self._apply_session_command(command)
+
         lock_name = command['lock_name']
         client_id = command.get('client_id', 'SYSTEM_TIMEOUT')
         lock_type = command.get('lock_type', 'exclusive')
+        now = command.get('timestamp', time.time())
+        session_id = command.get('session_id')
 
-        granted = False
         if command['type'] == 'ACQUIRE':
-            current_lock = self.locks.get(lock_name)
-            
-            if not current_lock:
-                granted = True
-            elif current_lock['type'] == 'shared' and lock_type == 'shared':
-                granted = True
+            if session_id is not None and session_id not in self.sessions:
+                return LockOutcome.NO_SESSION
+            path = lock_path(lock_name, lock_type)
+            blocked = self._blocked_on(path, client_id)
+            if blocked is None:
+                self._grant_path(lock_name, lock_type, client_id, command['expiry'], session_id, now)
+                return LockOutcome.GRANTED
             
-            if granted:
-                if not current_lock:
-                    self.locks[lock_name] = {'type': lock_type, 'holders': [client_id], 'expiry': command['expiry']}
-                else:
-                    self.locks[lock_name]['holders'].append(client_id)
-                
-                event = self.waiting_clients.get(client_id)
-                if event: event.set()
-                return True
+            if not command.get('wait'):
+                return LockOutcome.DENIED
+            if self._find_waiter(lock_name, client_id) is None:
+                waiter = {'client_id': client_id, 'lock_type': lock_type, 'ttl': command['expiry'] - now, 'deadline': command['expiry'], 'session_id': session_id}
+                if blocked != lock_name:
+                    waiter['target'] = lock_name
+                self._enqueue(blocked, waiter)
+            return LockOutcome.QUEUED
 
         elif command['type'] == 'RELEASE':
             if lock_name in self.locks:
                  current_lock = self.locks[lock_name]
                  
                  if client_id == 'SYSTEM_TIMEOUT':
-                      del self.locks[lock_name]
-                      return True
-
-                 elif client_id in current_lock['holders']:
-                      current_lock['holders'].remove(client_id)
-                      if not current_lock['holders']:
-                         del self.locks[lock_name]
-                         return True
+                      if command.get('expiry', current_lock['expiry']) != current_lock['expiry']:
+                           return LockOutcome.NOT_HELD
+                      holders = [(holder, intention) for holder, intention in zip(current_lock['holders'], current_lock['intentions']) if not self._held_by_session(current_lock, holder)]
+                 elif self._explicit_mode(lock_name, client_id) is not None:
+                      self._release_path(lock_name, client_id, now)
+                      return LockOutcome.RELEASED
+                 else:
+                      return LockOutcome.NOT_HELD
+                 
+                 for holder, intention in holders:
+                      if intention:
+                           self._release_holder(lock_name, holder, now, intention=True, reason='expired')
+                      else:
+                           self._release_path(lock_name, holder, now, reason='expired')
+                 return LockOutcome.RELEASED
+            return LockOutcome.NOT_HELD
+
+        elif command['type'] in ('CANCEL', 'ABORT'):
+            self._pending_aborts.discard((lock_name, client_id))
+            found = self._find_waiter(lock_name, client_id)
+            if found is None:
+                return LockOutcome.NOT_HELD
+            
+            queue, position = found
+            del self.locks[queue]['waiters'][position]
+            self._unindex_waiter(client_id, queue)
+            if position == 0:
+                self._grant_next(queue, now)
+            if command['type'] == 'CANCEL':
+                return LockOutcome.CANCELLED
+            future = self._grant_futures.pop((lock_name, client_id), None)
+            if future is not None and not future.done():
+                future.set_result(LockOutcome.ABORTED)
+            return LockOutcome.ABORTED
+
+    def _find_waiter(self, lock_name: str, client_id: str) -> Optional[Tuple[str, int]]:
+        for name, _ in lock_path(lock_name, 'IS'):
+            for position, waiter in enumerate(self.locks.get(name, {}).get('waiters', [])):
+                if waiter['client_id'] == client_id and waiter.get('target', name) == lock_name:
+                    return name, position
+        return None
+
+    def _enqueue(self, lock_name: str, waiter: Dict[str, Any]):
+        self.locks[lock_name].setdefault('waiters', []).append(waiter)
+        self._waiting_on.setdefault(waiter['client_id'], set()).add(lock_name)
+        self._detect_deadlock(waiter.get('target', lock_name), waiter['client_id'])
+
+    def _unindex_waiter(self, client_id: str, lock_name: str):
+        locks = self._waiting_on.get(client_id)
+        if locks is not None:
+            locks.discard(lock_name)
+            if not locks:
+                del self._waiting_on[client_id]
+
+    def _waits_for_cycle(self, start: str) -> bool:
+        stack = [start]
+        seen = {start}
+        while stack:
+            client_id = stack.pop()
+            for lock_name in self._waiting_on.get(client_id, ()):
+                for holder in self.locks.get(lock_name, {}).get('holders', []):
+                    if holder == start:
+                        return True
+                    if holder not in seen:
+                        seen.add(holder)
+                        stack.append(holder)
+        return False
+
+    def _detect_deadlock(self, lock_name: str, client_id: str):
+        if (lock_name, client_id) in self._pending_aborts or not self.is_leader():
+            return
+        if self._waits_for_cycle(client_id):
+            self._pending_aborts.add((lock_name, client_id))
+            asyncio.get_running_loop().call_soon(self._propose_abort, lock_name, client_id)
+
+    def _propose_abort(self, lock_name: str, client_id: str):
+        print(f"DEADLOCK DETECTED: Wait-for cycle through {client_id}. Aborting its wait on {lock_name}.")
+        success, _, commit = self.raft_node.propose({"type": "ABORT", "lock_name": lock_name, "client_id": client_id, "timestamp": time.time()})
+        if not success:
+            self._pending_aborts.discard((lock_name, client_id))
+            return
+        commit.add_done_callback(lambda future: self._pending_aborts.discard((lock_name, client_id)))
+
+    def _can_grant(self, lock_name: str, mode: str, client_id: str, queued: bool = False) -> bool:
+        current_lock = self.locks.get(lock_name)
+        if not current_lock:
+            return True
+        
+        held = list(zip(current_lock['holders'], current_lock['modes']))
+        if any(holder == client_id and combine_modes(current, mode) == current for holder, current in held):
+            return True
+        if current_lock.get('waiters') and not queued:
             return False
+        return all(current in COMPATIBLE_MODES[mode] for holder, current in held if holder != client_id)
+
+    def _blocked_on(self, path: List[Tuple[str, str]], client_id: str, queue: Optional[str] = None) -> Optional[str]:
+        return next((name for name, mode in path if not self._can_grant(name, mode, client_id, name == queue)), None)
+
+    def _explicit_mode(self, lock_name: str, client_id: str) -> Optional[str]:
+        lock = self.locks.get(lock_name, {})
+        held = zip(lock.get('holders', []), lock.get('modes', []), lock.get('intentions', []))
+        return next((mode for holder, mode, intention in held if holder == client_id and not intention), None)
+
+    def _grant_path(self, lock_name: str, lock_type: str, client_id: str, expiry: float, session_id: Optional[str], now: float):
+        path = lock_path(lock_name, lock_type)
+        held = self._explicit_mode(lock_name, client_id)
+        if held is not None and combine_modes(held, path[-1][1]) == held:
+            return
+        
+        previous = lock_path(lock_name, held)[:-1] if held is not None else []
+        if path[:-1] != previous:
+            for name, mode in path[:-1]:
+                self._grant(name, mode, client_id, expiry, session_id, intention=True)
+        self._grant(lock_name, path[-1][1], client_id, expiry, session_id)
+        if previous and path[:-1] != previous:
+            for name, mode in reversed(previous):
+                self._release_holder(name, client_id, now, mode, intention=True)
+
+    def _grant(self, lock_name: str, mode: str, client_id: str, expiry: float, session_id: Optional[str], intention: bool = False):
+        current_lock = self.locks.get(lock_name)
+        if not current_lock:
+            current_lock = self.locks[lock_name] = {'type': None, 'holders': [], 'modes': [], 'intentions': [], 'expiry': expiry, 'waiters': []}
+            heapq.heappush(self._expiry_heap, (expiry, lock_name))
+        elif not current_lock['holders'] or expiry > current_lock['expiry']:
+            current_lock['expiry'] = expiry
+            heapq.heappush(self._expiry_heap, (expiry, lock_name))
+        
+        held = zip(current_lock['holders'], current_lock['intentions'])
+        position = None if intention else next((i for i, (holder, implied) in enumerate(held) if holder == client_id and not implied), None)
+        if position is None:
+            current_lock['holders'].append(client_id)
+            current_lock['modes'].append(mode)
+            current_lock['intentions'].append(intention)
+        else:
+            mode = current_lock['modes'][position] = combine_modes(current_lock['modes'][position], mode)
+        current_lock['type'] = self._lock_type(current_lock['modes'])
+        self._attach_session(lock_name, client_id, session_id)
+        self._notify('granted', lock_name, client_id, mode)
+
+    @staticmethod
+    def _lock_type(modes: List[str]) -> str:
+        mode = reduce(combine_modes, modes)
+        return MODE_NAMES.get(mode, mode)
+
+    def _apply_batch_command(self, command: Dict[str, Any]):
+        client_id = command['client_id']
+        now = command.get('timestamp', time.time())
+        
+        if command['type'] == 'ACQUIRE_MANY':
+            session_id = command.get('session_id')
+            if session_id is not None and session_id not in self.sessions:
+                return LockOutcome.NO_SESSION
+            paths = [step for lock in command['locks'] for step in lock_path(lock['lock_name'], lock['lock_type'])]
+            if self._blocked_on(paths, client_id) is not None:
+                return LockOutcome.DENIED
+            for lock in command['locks']:
+                self._grant_path(lock['lock_name'], lock['lock_type'], client_id, command['expiry'], session_id, now)
+            return LockOutcome.GRANTED
         
+        held = [name for name in command['lock_names'] if self._explicit_mode(name, client_id) is not None]
+        for name in held:
+            self._release_path(name, client_id, now)
+        return LockOutcome.RELEASED if len(held) == len(command['lock_names']) else LockOutcome.NOT_HELD
+
+    def _apply_session_command(self, command: Dict[str, Any]):
+        now = command['timestamp']
+        
+        if command['type'] == 'SESSION_OPEN':
+            session = {'client_id': command['client_id'], 'ttl': command['ttl'], 'expiry': now + command['ttl'], 'locks': {}}
+            self.sessions[command['session_id']] = session
+            heapq.heappush(self._session_heap, (session['expiry'], command['session_id']))
+            return LockOutcome.SESSION_OPENED
+
+        if command['type'] == 'KEEPALIVE':
+            expiries = {}
+            for session_id in command['session_ids']:
+                session = self.sessions.get(session_id)
+                if session is None:
+                    continue
+                session['expiry'] = now + session['ttl']
+                heapq.heappush(self._session_heap, (session['expiry'], session_id))
+                expiries[session_id] = session['expiry']
+            return expiries
+
+        session = self.sessions.get(command['session_id'])
+        if session is None or command.get('expiry', session['expiry']) != session['expiry']:
+            return LockOutcome.NO_SESSION
+        
+        del self.sessions[command['session_id']]
+        reason = 'expired' if command['type'] == 'SESSION_EXPIRE' else 'released'
+        for lock_name, client_id in session['locks'].items():
+            for intention in (False, True):
+                while self._release_holder(lock_name, client_id, now, intention=intention, reason=reason):
+                    continue
+        return LockOutcome.SESSION_CLOSED
+
+    def _attach_session(self, lock_name: str, client_id: str, session_id: Optional[str]):
+        if session_id is None or session_id not in self.sessions:
+            return
+        self.locks[lock_name].setdefault('sessions', {})[client_id] = session_id
+        self.sessions[session_id]['locks'][lock_name] = client_id
+
+    def _held_by_session(self, lock: Dict[str, Any], client_id: str) -> bool:
+        return lock.get('sessions', {}).get(client_id) in self.sessions
+
+    def _release_holder(self, lock_name: str, client_id: str, now: float, mode: Optional[str] = None, intention: bool = False, reason: str = 'released') -> Optional[str]:
+        lock = self.locks.get(lock_name)
+        if lock is None:
+            return None
+        
+        positions = [i for i, holder in enumerate(lock['holders']) if holder == client_id and lock['intentions'][i] == intention]
+        if not positions:
+            return None
+        position = ([i for i in positions if lock['modes'][i] == mode] or positions)[-1]
+        del lock['holders'][position]
+        del lock['intentions'][position]
+        released = lock['modes'].pop(position)
+        if client_id not in lock['holders']:
+            session_id = lock.get('sessions', {}).pop(client_id, None)
+            if session_id in self.sessions:
+                self.sessions[session_id]['locks'].pop(lock_name, None)
+        if lock['holders']:
+            lock['type'] = self._lock_type(lock['modes'])
+        self._notify(reason, lock_name, client_id, released)
+        self._grant_next(lock_name, now)
+        return released
+
+    def _release_path(self, lock_name: str, client_id: str, now: float, reason: str = 'released'):
+        mode = self._release_holder(lock_name, client_id, now, reason=reason)
+        if mode is None:
+            return
+        for name, implied in reversed(lock_path(lock_name, mode)[:-1]):
+            self._release_holder(name, client_id, now, implied, intention=True, reason=reason)
+
+    def _grant_next(self, lock_name: str, now: float):
+        lock = self.locks[lock_name]
+        waiters = lock.setdefault('waiters', [])
+        granted = []
+        while waiters:
+            waiter = waiters[0]
+            if waiter['deadline'] < now or (waiter.get('session_id') is not None and waiter['session_id'] not in self.sessions):
+                waiters.pop(0)
+                self._unindex_waiter(waiter['client_id'], lock_name)
+                continue
+            
+            path = lock_path(waiter.get('target', lock_name), waiter['lock_type'])
+            blocked = self._blocked_on(path, waiter['client_id'], lock_name)
+            if blocked == lock_name:
+                break
+            waiters.pop(0)
+            self._unindex_waiter(waiter['client_id'], lock_name)
+            if blocked is not None:
+                self._enqueue(blocked, waiter)
+                continue
+            self._grant_path(waiter.get('target', lock_name), waiter['lock_type'], waiter['client_id'], now + waiter['ttl'], waiter.get('session_id'), now)
+            granted.append(waiter)
+        
+        if not lock['holders'] and not waiters:
+            del self.locks[lock_name]
+        for waiter in granted:
+            future = self._grant_futures.pop((waiter.get('target', lock_name), waiter['client_id']), None)
+            if future is not None and not future.done():
+                future.set_result(LockOutcome.GRANTED)
+        if granted:
+            for waiter in waiters:
+                self._detect_deadlock(waiter.get('target', lock_name), waiter['client_id'])
+        
+    def _is_current_expiry(self, lock_name: str, expiry: float) -> bool:
+        lock = self.locks.get(lock_name)
+        if lock is None or lock['expiry'] != expiry:
+            return False
+        return not all(self._held_by_session(lock, holder) for holder in lock['holders'])
+
+    def _is_current_session_expiry(self, session_id: str, expiry: float) -> bool:
+        session = self.sessions.get(session_id)
+        return session is not None and session['expiry'] == expiry
+
+    def check_expired_locks(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        released = self._expire_due(self._session_heap, self._is_current_session_expiry, now,
+                                    lambda session_id, expiry: {"type": "SESSION_EXPIRE", "session_id": session_id, "expiry": expiry, "timestamp": now})
+        released += self._expire_due(self._expiry_heap, self._is_current_expiry, now,
+                                     lambda name, expiry: {"type": "RELEASE", "lock_name": name, "client_id": "SYSTEM_TIMEOUT", "expiry": expiry, "timestamp": now})
+        return released
+
+    def _expire_due(self, heap: List[Tuple[float, str]], is_current, now: float, build_command) -> int:
+        released = 0
+        while heap and heap[0][0] < now:
+            expiry, name = heapq.heappop(heap)
+            command = build_command(name, expiry)
+            key = (command['type'], name)
+            if not is_current(name, expiry) or self._pending_expiries.get(key) == expiry:
+                continue
+
+            if command['type'] == 'RELEASE':
+                print(f"DEADLOCK DETECTED: Lock {name} expired. Force releasing.")
+            else:
+                print(f"Session {name} expired. Releasing its locks.")
+
+            success, _, commit = self.raft_node.propose(command)
+            if not success:
+                heapq.heappush(heap, (expiry, name))
+                break
+            
+            self._pending_expiries[key] = expiry
+            commit.add_done_callback(lambda future, heap=heap, key=key, expiry=expiry, is_current=is_current: self._expiry_release_done(future, heap, key, expiry, is_current))
+            released += 1
+        return released
+
+    def _expiry_release_done(self, future: asyncio.Future, heap: List[Tuple[float, str]], key: Tuple[str, str], expiry: float, is_current):
+        if self._pending_expiries.get(key) == expiry:
+            del self._pending_expiries[key]
+        if (future.cancelled() or future.exception() is not None) and is_current(key[1], expiry):
+            heapq.heappush(heap, (expiry, key[1]))
+
+    def _compact_heap(self, heap: List[Tuple[float, str]], entries: Dict[str, Dict]):
+        if len(heap) > 2 * len(entries) + self.heap_slack:
+            heap[:] = [(entry['expiry'], name) for name, entry in entries.items()]
+            heapq.heapify(heap)
+
+    def compact_heaps(self):
+        self._compact_heap(self._expiry_heap, self.locks)
+        self._compact_heap(self._session_heap, self.sessions)
+
     async def deadlock_monitor(self):
         while True:
             if self.raft_node and self.is_leader():
-                now = time.time()
-                
-                for name, lock_data in list(self.locks.items()):
-                    if lock_data.get('expiry', 0) < now: 
-
-                        print(f"DEADLOCK DETECTED: Lock {name} expired. Force releasing.")
-
-                        release_cmd = {"type": "RELEASE", "lock_name": name, "client_id": "SYSTEM_TIMEOUT"}
-                        self.raft_node.submit_command(release_cmd) 
+                self.check_expired_locks()
+            self.compact_heaps()
                         
-            await asyncio.sleep(0.5)
\ No newline at end of file
+            await asyncio.sleep(0.5)
@@ -0,0 +1,167 @@
+import uuid
+import asyncio
+from typing import Dict, Any, List, Optional
+
+from src.nodes.lock_manager import DistributedLockManager
+from src.nodes.queue_node import ConsistentHashRing
+
+class LockShardRouter:
+    def __init__(self, groups: Dict[str, DistributedLockManager]):
+        self.groups = groups
+        self.ring = ConsistentHashRing(sorted(groups))
+        self.watch_queue_size = 1000
+
+    @staticmethod
+    def group_ids(count: int) -> List[str]:
+        return [f"g{i}" for i in range(count)]
+
+    @staticmethod
+    def preferred_leader(group_id: str, node_ids: List[str]) -> str:
+        ordered = sorted(node_ids)
+        return ordered[int(group_id[1:]) % len(ordered)]
+
+    @staticmethod
+    def routing_key(lock_name: str) -> str:
+        root = lock_name.lstrip('/').split('/', 1)[0] or lock_name
+        start = root.find('{')
+        end = root.find('}', start + 1)
+        if start != -1 and end > start + 1:
+            return root[start + 1:end]
+        return root
+
+    def group_for(self, lock_name: str) -> str:
+        return self.ring.get_node(self.routing_key(lock_name))
+
+    def manager_for(self, lock_name: str) -> DistributedLockManager:
+        return self.groups[self.group_for(lock_name)]
+
+    def raft_nodes(self):
+        return [manager.raft_node for manager in self.groups.values()]
+
+    async def acquire_lock(self, lock_name: str, lock_type: str, client_id: str, timeout: float = 10.0, forwarded: bool = False, wait: bool = False, session_id: Optional[str] = None):
+        return await self.manager_for(lock_name).acquire_lock(lock_name, lock_type, client_id, timeout, forwarded, wait, session_id)
+
+    async def release_lock(self, lock_name: str, client_id: str, forwarded: bool = False):
+        return await self.manager_for(lock_name).release_lock(lock_name, client_id, forwarded=forwarded)
+
+    async def acquire_many(self, locks: List[Dict[str, str]], client_id: str, timeout: float = 10.0, forwarded: bool = False, session_id: Optional[str] = None):
+        by_group: Dict[str, List[Dict[str, str]]] = {}
+        for lock in locks:
+            by_group.setdefault(self.group_for(lock['lock_name']), []).append(lock)
+        
+        acquired: List[str] = []
+        for group_id in sorted(by_group):
+            result = await self.groups[group_id].acquire_many(by_group[group_id], client_id, timeout, forwarded, session_id)
+            if not result.get('success'):
+                await asyncio.gather(*[self.groups[gid].release_many([lock['lock_name'] for lock in by_group[gid]], client_id, forwarded) for gid in acquired])
+                return result
+            acquired.append(group_id)
+        return {"success": True, "message": f"{len({lock['lock_name'] for lock in locks})} locks acquired"}
+
+    async def release_many(self, lock_names: List[str], client_id: str, forwarded: bool = False):
+        by_group: Dict[str, List[str]] = {}
+        for name in lock_names:
+            by_group.setdefault(self.group_for(name), []).append(name)
+        
+        results = await asyncio.gather(*[self.groups[gid].release_many(names, client_id, forwarded) for gid, names in by_group.items()])
+        for result in results:
+            if not result.get('success'):
+                return result
+        return {"success": True, "message": "Locks released"}
+
+    async def get_lock_status(self, lock_name: str, forwarded: bool = False):
+        manager = self.manager_for(lock_name)
+        response = await manager.get_lock_status(lock_name)
+        return await self._read_from_leader(manager, response, '/lock/status', {"lock_name": lock_name, "forwarded": "true"}, forwarded)
+
+    async def list_holders(self, lock_name: str, forwarded: bool = False):
+        manager = self.manager_for(lock_name)
+        response = await manager.list_holders(lock_name)
+        return await self._read_from_leader(manager, response, '/lock/holders', {"lock_name": lock_name, "forwarded": "true"}, forwarded)
+
+    async def list_locks(self, prefix: str = ""):
+        results = await asyncio.gather(*[self._list_group_locks(group_id, prefix) for group_id in self.groups])
+        for result in results:
+            if not result.get('success'):
+                return result
+
+        locks = sorted((lock for result in results for lock in result['locks']), key=lambda lock: lock['lock_name'])
+        return {"success": True, "prefix": prefix, "locks": locks}
+
+    async def _list_group_locks(self, group_id: str, prefix: str):
+        manager = self.groups[group_id]
+        response = await manager.list_locks(prefix)
+        return await self._read_from_leader(manager, response, '/lock/list', {"prefix": prefix, "group_id": group_id})
+
+    async def _read_from_leader(self, manager: DistributedLockManager, response: Dict[str, Any], endpoint: str, params: Dict[str, Any], forwarded: bool = False):
+        leader_id = manager.raft_node.leader_id
+        if forwarded or response.get('error') != 'NOT_LEADER' or leader_id is None or leader_id == manager.raft_node.node_id:
+            return response
+
+        return await manager.raft_node.comm.send_get_rpc(leader_id, endpoint, params, timeout=2.0)
+
+    def _watch_groups(self, lock_names: List[str], prefixes: List[str]) -> List[str]:
+        return sorted(set(self.groups) if prefixes else {self.group_for(name) for name in lock_names})
+
+    def watch(self, lock_names: List[str], prefixes: List[str]) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.watch_queue_size)
+        for group_id in self._watch_groups(lock_names, prefixes):
+            self.groups[group_id].watch(queue, lock_names, prefixes)
+        return queue
+
+    def watch_cursor(self, lock_names: List[str], prefixes: List[str]) -> Dict[str, int]:
+        return {group_id: self.groups[group_id].applied_index() for group_id in self._watch_groups(lock_names, prefixes)}
+
+    def events_since(self, cursor: Dict[str, int], lock_names: List[str], prefixes: List[str]) -> Optional[List[Dict[str, Any]]]:
+        events = []
+        for group_id in self._watch_groups(lock_names, prefixes):
+            if group_id not in cursor:
+                continue
+            missed = self.groups[group_id].events_since(cursor[group_id], lock_names, prefixes)
+            if missed is None:
+                return None
+            events.extend(missed)
+        return events
+
+    def unwatch(self, queue: asyncio.Queue):
+        for manager in self.groups.values():
+            manager.unwatch(queue)
+
+    def _session_groups(self, group_id: Optional[str]) -> List[DistributedLockManager]:
+        if group_id is not None:
+            return [self.groups[group_id]]
+        return list(self.groups.values())
+
+    async def open_session(self, client_id: str, ttl: float = 10.0, forwarded: bool = False, group_id: Optional[str] = None, session_id: Optional[str] = None):
+        session_id = session_id or str(uuid.uuid4())
+        results = await asyncio.gather(*[m.open_session(session_id, client_id, ttl, forwarded) for m in self._session_groups(group_id)])
+        return self._merge_session_results(session_id, results)
+
+    async def keep_alive(self, session_id: str, forwarded: bool = False, group_id: Optional[str] = None):
+        results = await asyncio.gather(*[m.keep_alive(session_id, forwarded) for m in self._session_groups(group_id)])
+        return self._merge_session_results(session_id, results)
+
+    async def close_session(self, session_id: str, forwarded: bool = False, group_id: Optional[str] = None):
+        results = await asyncio.gather(*[m.close_session(session_id, forwarded) for m in self._session_groups(group_id)])
+        return self._merge_session_results(session_id, results)
+
+    def _merge_session_results(self, session_id: str, results: List[Dict[str, Any]]):
+        for result in results:
+            if not result.get('success'):
+                return result
+        response = {"success": True, "session_id": session_id}
+        expiries = [result['expiry'] for result in results if 'expiry' in result]
+        if expiries:
+            response['expiry'] = min(expiries)
+        return response
+
+    async def transfer_leadership(self, group_id: Optional[str] = None, target_id: Optional[str] = None):
+        if group_id is not None and group_id not in self.groups:
+            return {"success": False, "error": "UNKNOWN_GROUP", "group_id": group_id}
+        
+        group_ids = [group_id] if group_id else [gid for gid, manager in self.groups.items() if manager.is_leader()]
+        results = await asyncio.gather(*[self.groups[gid].raft_node.transfer_leadership(target_id) for gid in group_ids])
+        return {"success": all(result['success'] for result in results), "groups": dict(zip(group_ids, results))}
+
+    async def deadlock_monitor(self):
+        await asyncio.gather(*[manager.deadlock_monitor() for manager in self.groups.values()])
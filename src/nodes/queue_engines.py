@@ -0,0 +1,242 @@
+import json
+import uuid
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional, Set
+
+from redis.exceptions import ResponseError
+
+MOVE_TO_PENDING_SCRIPT = """
+local messages = {}
+for i = 1, tonumber(ARGV[1]) do
+    local message = redis.call('LPOP', KEYS[1])
+    if not message then
+        break
+    end
+    local id = cjson.decode(message)['id']
+    redis.call('HSET', KEYS[2], id, message)
+    redis.call('ZADD', KEYS[3], ARGV[2], id)
+    messages[i] = message
+end
+if #messages > 0 then
+    redis.call('ZADD', KEYS[4], 'NX', ARGV[2], ARGV[3])
+end
+return messages
+"""
+
+REQUEUE_EXPIRED_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for i = #ids, 1, -1 do
+    local message = redis.call('HGET', KEYS[2], ids[i])
+    if message then
+        redis.call('LPUSH', KEYS[1], message)
+        redis.call('HDEL', KEYS[2], ids[i])
+    end
+    redis.call('ZREM', KEYS[3], ids[i])
+end
+local next_deadline = redis.call('ZRANGE', KEYS[3], 0, 0, 'WITHSCORES')
+if next_deadline[2] then
+    redis.call('ZADD', KEYS[4], next_deadline[2], ARGV[3])
+else
+    redis.call('ZREM', KEYS[4], ARGV[3])
+end
+return ids
+"""
+
+RETIRE_STREAM_TOPIC_SCRIPT = """
+if redis.call('XPENDING', KEYS[1], ARGV[1])[1] == 0 then
+    redis.call('ZREM', KEYS[2], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+class QueueEngine(ABC):
+    DEADLINES_KEY = "queue_topic_deadlines"
+
+    def __init__(self, redis_conn, consumer_name: str, redelivery_timeout: float, max_batch: int):
+        self.redis_conn = redis_conn
+        self.consumer_name = consumer_name
+        self.redelivery_timeout = redelivery_timeout
+        self.max_batch = max_batch
+
+    async def due_topics(self, now: float) -> List[str]:
+        return await self.redis_conn.zrangebyscore(self.DEADLINES_KEY, '-inf', now)
+
+    @abstractmethod
+    async def publish(self, topic: str, messages_data: List[Dict[str, Any]], now: float) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def consume(self, topic: str, count: int, now: float) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def acknowledge(self, topic: str, message_ids: List[str]) -> List[str]:
+        ...
+
+    @abstractmethod
+    async def requeue_expired(self, topic: str, now: float) -> int:
+        ...
+
+    @abstractmethod
+    async def pending_info(self, topic: str, now: float, message_id: Optional[str] = None) -> Dict[str, Any]:
+        ...
+
+class ListQueueEngine(QueueEngine):
+    QUEUE_PREFIX = "q:"
+    PENDING_PREFIX = "pending_q:"
+    META_SUFFIX = "_meta"
+    DEADLINE_SUFFIX = "_deadlines"
+
+    def __init__(self, redis_conn, consumer_name: str, redelivery_timeout: float, max_batch: int):
+        super().__init__(redis_conn, consumer_name, redelivery_timeout, max_batch)
+        self._move_to_pending = redis_conn.register_script(MOVE_TO_PENDING_SCRIPT)
+        self._requeue_expired = redis_conn.register_script(REQUEUE_EXPIRED_SCRIPT)
+
+    def keys(self, topic: str) -> List[str]:
+        pending_key = f"{self.PENDING_PREFIX}{topic}"
+        return [f"{self.QUEUE_PREFIX}{topic}", f"{pending_key}{self.META_SUFFIX}", f"{pending_key}{self.DEADLINE_SUFFIX}"]
+
+    async def publish(self, topic: str, messages_data: List[Dict[str, Any]], now: float) -> List[Dict[str, Any]]:
+        messages = [{"id": uuid.uuid4().hex[:16], "timestamp": now, "data": data, "topic": topic} for data in messages_data]
+        await self.redis_conn.rpush(f"{self.QUEUE_PREFIX}{topic}", *[json.dumps(message) for message in messages])
+        return messages
+
+    async def consume(self, topic: str, count: int, now: float) -> List[Dict[str, Any]]:
+        raw_messages = await self._move_to_pending(keys=self.keys(topic) + [self.DEADLINES_KEY], args=[count, now + self.redelivery_timeout, topic])
+        messages = [json.loads(raw) for raw in raw_messages]
+        for message in messages:
+            message["sent_time"] = now
+        return messages
+
+    async def acknowledge(self, topic: str, message_ids: List[str]) -> List[str]:
+        _, meta_key, deadline_key = self.keys(topic)
+        async with self.redis_conn.pipeline(transaction=True) as pipe:
+            stored, _, _ = await pipe.hmget(meta_key, message_ids).hdel(meta_key, *message_ids).zrem(deadline_key, *message_ids).execute()
+        return [message_id for message_id, message_str in zip(message_ids, stored) if message_str]
+
+    async def requeue_expired(self, topic: str, now: float) -> int:
+        requeued = 0
+        while True:
+            message_ids = await self._requeue_expired(keys=self.keys(topic) + [self.DEADLINES_KEY], args=[now, self.max_batch, topic])
+            requeued += len(message_ids)
+            if len(message_ids) < self.max_batch:
+                return requeued
+
+    async def pending_info(self, topic: str, now: float, message_id: Optional[str] = None) -> Dict[str, Any]:
+        _, meta_key, deadline_key = self.keys(topic)
+        async with self.redis_conn.pipeline(transaction=False) as pipe:
+            pipe.hlen(meta_key).zrange(deadline_key, 0, 0, withscores=True)
+            if message_id is not None:
+                pipe.hget(meta_key, message_id).zscore(deadline_key, message_id)
+            results = await pipe.execute()
+
+        info = {"pending": results[0], "next_deadline": results[1][0][1] if results[1] else None}
+        if message_id is not None:
+            info["message"] = json.loads(results[2]) if results[2] else None
+            info["deadline"] = results[3]
+        return info
+
+class StreamQueueEngine(QueueEngine):
+    STREAM_PREFIX = "stream:"
+    GROUP_NAME = "queue_consumers"
+
+    def __init__(self, redis_conn, consumer_name: str, redelivery_timeout: float, max_batch: int):
+        super().__init__(redis_conn, consumer_name, redelivery_timeout, max_batch)
+        self._groups: Set[str] = set()
+        self._claimable: Set[str] = set()
+        self._retire_topic = redis_conn.register_script(RETIRE_STREAM_TOPIC_SCRIPT)
+
+    def key(self, topic: str) -> str:
+        return f"{self.STREAM_PREFIX}{topic}"
+
+    async def _ensure_group(self, key: str):
+        if key in self._groups:
+            return
+        try:
+            await self.redis_conn.xgroup_create(key, self.GROUP_NAME, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._groups.add(key)
+
+    def _message(self, topic: str, entry_id: str, fields: Dict[str, str], now: float) -> Dict[str, Any]:
+        return {"id": entry_id, "timestamp": float(fields["timestamp"]), "data": json.loads(fields["data"]), "topic": topic, "sent_time": now}
+
+    async def publish(self, topic: str, messages_data: List[Dict[str, Any]], now: float) -> List[Dict[str, Any]]:
+        key = self.key(topic)
+        await self._ensure_group(key)
+        async with self.redis_conn.pipeline(transaction=False) as pipe:
+            for data in messages_data:
+                pipe.xadd(key, {"timestamp": now, "data": json.dumps(data)})
+            entry_ids = await pipe.execute()
+        return [{"id": entry_id, "timestamp": now, "data": data, "topic": topic} for entry_id, data in zip(entry_ids, messages_data)]
+
+    async def consume(self, topic: str, count: int, now: float) -> List[Dict[str, Any]]:
+        key = self.key(topic)
+        await self._ensure_group(key)
+
+        entries = []
+        if topic in self._claimable:
+            claimed = await self.redis_conn.xautoclaim(key, self.GROUP_NAME, self.consumer_name, int(self.redelivery_timeout * 1000), start_id='0-0', count=count)
+            entries = claimed[1]
+            if len(entries) < count:
+                self._claimable.discard(topic)
+        if len(entries) < count:
+            response = await self.redis_conn.xreadgroup(self.GROUP_NAME, self.consumer_name, {key: '>'}, count=count - len(entries))
+            if response:
+                entries = entries + response[0][1]
+        if entries:
+            await self.redis_conn.zadd(self.DEADLINES_KEY, {topic: now + self.redelivery_timeout}, nx=True)
+        return [self._message(topic, entry_id, fields, now) for entry_id, fields in entries if fields]
+
+    async def acknowledge(self, topic: str, message_ids: List[str]) -> List[str]:
+        key = self.key(topic)
+        async with self.redis_conn.pipeline(transaction=False) as pipe:
+            for message_id in message_ids:
+                pipe.xack(key, self.GROUP_NAME, message_id)
+            results = await pipe.execute(raise_on_error=False)
+
+        acked = [message_id for message_id, result in zip(message_ids, results) if result == 1]
+        if acked:
+            await self.redis_conn.xdel(key, *acked)
+        return acked
+
+    async def requeue_expired(self, topic: str, now: float) -> int:
+        key = self.key(topic)
+        await self._ensure_group(key)
+        if await self._retire_topic(keys=[key, self.DEADLINES_KEY], args=[self.GROUP_NAME, topic]):
+            self._claimable.discard(topic)
+            return 0
+
+        expired = await self.redis_conn.xpending_range(key, self.GROUP_NAME, min='-', max='+', count=self.max_batch, idle=int(self.redelivery_timeout * 1000))
+        if expired:
+            if topic in self._claimable:
+                return 0
+            self._claimable.add(topic)
+            return len(expired)
+
+        pending = await self.redis_conn.xpending_range(key, self.GROUP_NAME, min='-', max='+', count=self.max_batch)
+        if pending:
+            idle = max(entry["time_since_delivered"] for entry in pending) / 1000
+            await self.redis_conn.zadd(self.DEADLINES_KEY, {topic: now + self.redelivery_timeout - idle})
+        return 0
+
+    async def pending_info(self, topic: str, now: float, message_id: Optional[str] = None) -> Dict[str, Any]:
+        key = self.key(topic)
+        await self._ensure_group(key)
+        async with self.redis_conn.pipeline(transaction=False) as pipe:
+            pipe.xpending(key, self.GROUP_NAME).xpending_range(key, self.GROUP_NAME, min='-', max='+', count=1)
+            if message_id is not None:
+                pipe.xrange(key, message_id, message_id).xpending_range(key, self.GROUP_NAME, min=message_id, max=message_id, count=1)
+            results = await pipe.execute(raise_on_error=False)
+
+        oldest = results[1]
+        info = {"pending": results[0]["pending"], "next_deadline": now - oldest[0]["time_since_delivered"] / 1000 + self.redelivery_timeout if oldest else None}
+        if message_id is not None:
+            entries = results[2] if isinstance(results[2], list) else []
+            pending = results[3] if isinstance(results[3], list) else []
+            sent_time = now - pending[0]["time_since_delivered"] / 1000 if pending else None
+            info["message"] = self._message(topic, entries[0][0], entries[0][1], sent_time) if entries and pending else None
+            info["deadline"] = sent_time + self.redelivery_timeout if pending else None
+        return info
@@ -1,11 +1,12 @@
-import redis
-import json
+import redis.asyncio as aioredis
 import time
 import hashlib
 import bisect
 import asyncio
 from typing import List, Dict, Any, Optional
 
+from src.nodes.queue_engines import QueueEngine, ListQueueEngine, StreamQueueEngine
+
 VIRTUAL_NODES = 100 
 HASH_SPACE = 2**32
 
@@ -41,100 +42,112 @@ class ConsistentHashRing:
         return self.ring[self.sorted_keys[pos]]
 
 class DistributedQueueNode:
-    QUEUE_PREFIX = "q:"
-    PENDING_PREFIX = "pending_q:"
-    META_SUFFIX = "_meta"
     REDELIVERY_TIMEOUT = 30
+    REDELIVERY_INTERVAL = 1.0
+    MAX_CONNECTIONS = 50
+    POOL_TIMEOUT = 5
+    MAX_BATCH = 1000
+    MAX_WAIT_MS = 30000
+    ENGINES = {'list': ListQueueEngine, 'streams': StreamQueueEngine}
 
-    def __init__(self, node_id: str, ring: ConsistentHashRing, redis_host: str = 'redis', redis_port: int = 6379):
+    def __init__(self, node_id: str, ring: ConsistentHashRing, redis_host: str = 'redis', redis_port: int = 6379, max_connections: Optional[int] = None, engine: str = 'list'):
         self.node_id = node_id
         self.ring = ring
-        self.redis_conn = redis.StrictRedis(host=redis_host, port=redis_port, decode_responses=True)
+        pool = aioredis.BlockingConnectionPool(host=redis_host, port=redis_port, decode_responses=True,
+                                               max_connections=max_connections or self.MAX_CONNECTIONS, timeout=self.POOL_TIMEOUT)
+        self.redis_conn = aioredis.Redis(connection_pool=pool)
+        self.engine: QueueEngine = self.ENGINES[engine](self.redis_conn, node_id, self.REDELIVERY_TIMEOUT, self.MAX_BATCH)
+        self._arrivals: Dict[str, asyncio.Event] = {}
 
     async def publish(self, topic: str, message_data: Dict[str, Any]):
-        responsible_node_id = self.ring.get_node(topic)
-        
-        if responsible_node_id is None:
-             return {"status": "FAILURE", "error": "No nodes available"}
+        response = await self.publish_batch(topic, [message_data])
+        if response["status"] == "SUCCESS":
+            response["message_id"] = response.pop("message_ids")[0]
+        return response
 
-        if responsible_node_id != self.node_id:
-            return {"status": "REDIRECT", "node": responsible_node_id}
+    async def publish_batch(self, topic: str, messages_data: List[Dict[str, Any]]):
+        redirect = self._route(topic)
+        if redirect:
+            return redirect
+        if not messages_data or len(messages_data) > self.MAX_BATCH:
+            return {"status": "FAILURE", "error": f"Batch size must be between 1 and {self.MAX_BATCH}"}
 
-        message_id = hashlib.sha1(f"{topic}-{time.time()}".encode()).hexdigest()[:10]
-        message = {
-            "id": message_id,
-            "timestamp": time.time(),
-            "data": message_data,
-            "topic": topic
-        }
-        
-        self.redis_conn.rpush(f"{self.QUEUE_PREFIX}{topic}", json.dumps(message))
-        return {"status": "SUCCESS", "message_id": message["id"], "node": self.node_id}
+        messages = await self.engine.publish(topic, messages_data, time.time())
+        self._notify(topic)
+        return {"status": "SUCCESS", "message_ids": [message["id"] for message in messages], "node": self.node_id}
 
-    async def consume(self, topic: str):
-        responsible_node_id = self.ring.get_node(topic)
-        if responsible_node_id != self.node_id:
-            return {"status": "REDIRECT", "node": responsible_node_id}
-            
-        queue_key = f"{self.QUEUE_PREFIX}{topic}"
-        pending_key = f"{self.PENDING_PREFIX}{topic}"
-        meta_key = f"{pending_key}{self.META_SUFFIX}"
-        
-        message_str = self.redis_conn.rpoplpush(queue_key, pending_key)
-        
-        if message_str:
-            message = json.loads(message_str)
-            message["sent_time"] = time.time()
+    async def consume(self, topic: str, wait_ms: int = 0):
+        response = await self.consume_batch(topic, 1, wait_ms)
+        if response["status"] == "MESSAGE_SENT":
+            response["message"] = response.pop("messages")[0]
+        return response
+
+    async def consume_batch(self, topic: str, count: int, wait_ms: int = 0):
+        redirect = self._route(topic)
+        if redirect:
+            return redirect
             
-            self.redis_conn.hset(meta_key, message["id"], json.dumps(message))
+        deadline = time.monotonic() + min(max(wait_ms, 0), self.MAX_WAIT_MS) / 1000
+        while True:
+            arrival = self._arrivals.setdefault(topic, asyncio.Event())
+            messages = await self.engine.consume(topic, max(1, min(count, self.MAX_BATCH)), time.time())
+            if messages:
+                return {"status": "MESSAGE_SENT", "messages": messages}
             
-            return {"status": "MESSAGE_SENT", "message": message}
-        
-        return {"status": "NO_MESSAGE"}
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return {"status": "NO_MESSAGE"}
+            try:
+                await asyncio.wait_for(arrival.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return {"status": "NO_MESSAGE"}
+
+    def _notify(self, topic: str):
+        arrival = self._arrivals.pop(topic, None)
+        if arrival is not None:
+            arrival.set()
 
     async def acknowledge(self, topic: str, message_id: str):
-        pending_key = f"{self.PENDING_PREFIX}{topic}"
-        meta_key = f"{pending_key}{self.META_SUFFIX}"
-        
-        message_str = self.redis_conn.hget(meta_key, message_id)
-        
-        deleted_count = self.redis_conn.hdel(meta_key, message_id)
-        
-        if deleted_count > 0 and message_str:
-            pipe = self.redis_conn.pipeline()
-            
-            pipe.lrem(pending_key, 1, message_str) 
-            
-            pipe.execute()
+        response = await self.acknowledge_batch(topic, [message_id])
+        if response["status"] == "ACK_RECEIVED":
             return {"status": "ACK_RECEIVED", "message_id": message_id}
-            
-        return {"status": "ACK_NOT_FOUND"}
+        return response
+
+    async def acknowledge_batch(self, topic: str, message_ids: List[str]):
+        if not message_ids:
+            return {"status": "ACK_NOT_FOUND"}
+
+        acked = await self.engine.acknowledge(topic, message_ids)
+        if not acked:
+            return {"status": "ACK_NOT_FOUND"}
+        return {"status": "ACK_RECEIVED", "acked": acked, "missing": [message_id for message_id in message_ids if message_id not in acked]}
+
+    async def pending_info(self, topic: str, message_id: Optional[str] = None):
+        info = await self.engine.pending_info(topic, time.time(), message_id)
+        return {"status": "SUCCESS", "topic": topic, **info}
+
+    def _route(self, topic: str) -> Optional[Dict[str, Any]]:
+        responsible_node_id = self.ring.get_node(topic)
+        if responsible_node_id is None:
+            return {"status": "FAILURE", "error": "No nodes available"}
+        if responsible_node_id != self.node_id:
+            return {"status": "REDIRECT", "node": responsible_node_id}
+        return None
+
+    async def requeue_expired(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        requeued = 0
+        for topic in await self.engine.due_topics(now):
+            if self.ring.get_node(topic) != self.node_id:
+                continue
+            expired = await self.engine.requeue_expired(topic, now)
+            if expired:
+                print(f"Redelivering {expired} messages for topic {topic} due to timeout.")
+                self._notify(topic)
+            requeued += expired
+        return requeued
 
     async def redelivery_monitor(self):
         while True:
-            for meta_key in self.redis_conn.keys(f"{self.PENDING_PREFIX}*{self.META_SUFFIX}"):
-                
-                topic = meta_key.split(self.PENDING_PREFIX)[1].replace(self.META_SUFFIX, "")
-                pending_key = f"{self.PENDING_PREFIX}{topic}"
-                
-                if self.ring.get_node(topic) != self.node_id:
-                    continue
-
-                pending_messages = self.redis_conn.hgetall(meta_key)
-                now = time.time()
-                
-                for msg_id, msg_str in pending_messages.items():
-                    msg = json.loads(msg_str)
-                    
-                    if now - msg.get("sent_time", 0) > self.REDELIVERY_TIMEOUT:
-                        print(f"Redelivering message {msg_id} for topic {topic} due to timeout.")
-                        
-                        pipe = self.redis_conn.pipeline()
-                        
-                        pipe.lpush(f"{self.QUEUE_PREFIX}{topic}", msg_str)
-                        pipe.hdel(meta_key, msg_id)
-                        pipe.lrem(pending_key, 1, msg_str)
-                        
-                        pipe.execute()
-                        
-            await asyncio.sleep(self.REDELIVERY_TIMEOUT / 3)
\ No newline at end of file
+            await self.requeue_expired()
+            await asyncio.sleep(self.REDELIVERY_INTERVAL)
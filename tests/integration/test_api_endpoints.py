@@ -14,9 +14,8 @@ def find_leader_url():
     for port in [8001, 8002, 8003]:
         url = f"http://localhost:{port}"
         try:
-            resp = requests.post(f"{url}/lock/acquire", json={"lock_name": "test_probe"}, timeout=0.5)
-            if resp.status_code == 200:
-                requests.post(f"{url}/lock/release", json={"lock_name": "test_probe"}, timeout=0.5)
+            resp = requests.get(f"{url}/lock/status", params={"lock_name": "test_probe"}, timeout=0.5)
+            if resp.status_code == 200 and resp.json().get('success'):
                 return url
         except:
             continue
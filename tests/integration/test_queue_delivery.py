@@ -1,18 +1,26 @@
 import pytest
+import pytest_asyncio
 import asyncio
 import time
-import redis
 from src.nodes.queue_node import DistributedQueueNode, ConsistentHashRing
 from typing import List, Dict, Any, Optional
 
 QUEUE_NODES: List[str] = ["q1"]
 TEST_RING = ConsistentHashRing(QUEUE_NODES)
 
-@pytest.fixture
-def queue_node():
+@pytest_asyncio.fixture
+async def queue_node():
     node = DistributedQueueNode("q1", TEST_RING, redis_host='localhost')
-    node.redis_conn.flushdb()
-    return node
+    await node.redis_conn.flushdb()
+    yield node
+    await node.redis_conn.aclose()
+
+@pytest_asyncio.fixture
+async def stream_node():
+    node = DistributedQueueNode("q1", TEST_RING, redis_host='localhost', engine='streams')
+    await node.redis_conn.flushdb()
+    yield node
+    await node.redis_conn.aclose()
 
 @pytest.mark.asyncio
 async def test_publish_consume_success(queue_node: DistributedQueueNode):
@@ -27,8 +35,8 @@ async def test_publish_consume_success(queue_node: DistributedQueueNode):
     ack_result = await queue_node.acknowledge(topic, consume_result['message']['id'])
     assert ack_result['status'] == "ACK_RECEIVED"
     
-    pending_meta_key = f"{queue_node.PENDING_PREFIX}{topic}{queue_node.META_SUFFIX}"
-    assert queue_node.redis_conn.hlen(pending_meta_key) == 0
+    _, pending_meta_key, _ = queue_node.engine.keys(topic)
+    assert await queue_node.redis_conn.hlen(pending_meta_key) == 0
 
 @pytest.mark.asyncio
 async def test_at_least_once_redelivery(queue_node: DistributedQueueNode):
@@ -39,15 +47,130 @@ async def test_at_least_once_redelivery(queue_node: DistributedQueueNode):
     consume_result = await queue_node.consume(topic)
     message_id = consume_result['message']['id']
     
-    pending_meta_key = f"{queue_node.PENDING_PREFIX}{topic}{queue_node.META_SUFFIX}"
-    assert queue_node.redis_conn.hget(pending_meta_key, message_id) is not None
+    _, pending_meta_key, _ = queue_node.engine.keys(topic)
+    assert await queue_node.redis_conn.hget(pending_meta_key, message_id) is not None
     
     await asyncio.sleep(queue_node.REDELIVERY_TIMEOUT + 1)
     
-    await queue_node.redelivery_monitor()
+    assert await queue_node.requeue_expired() == 1
     
     re_consume_result = await queue_node.consume(topic)
     assert re_consume_result['status'] == "MESSAGE_SENT"
     assert re_consume_result['message']['id'] == message_id
     
-    await queue_node.acknowledge(topic, message_id)
\ No newline at end of file
+    await queue_node.acknowledge(topic, message_id)
+
+@pytest.mark.asyncio
+async def test_batch_publish_consume_ack(queue_node: DistributedQueueNode):
+    topic = "batch_topic"
+
+    pub_result = await queue_node.publish_batch(topic, [{"n": i} for i in range(10)])
+    assert pub_result['status'] == "SUCCESS"
+    assert len(set(pub_result['message_ids'])) == 10
+
+    consume_result = await queue_node.consume_batch(topic, 4)
+    assert [m['data']['n'] for m in consume_result['messages']] == [0, 1, 2, 3]
+
+    ack_result = await queue_node.acknowledge_batch(topic, [m['id'] for m in consume_result['messages']] + ["unknown"])
+    assert ack_result['status'] == "ACK_RECEIVED"
+    assert len(ack_result['acked']) == 4
+    assert ack_result['missing'] == ["unknown"]
+
+    rest = await queue_node.consume_batch(topic, 100)
+    assert len(rest['messages']) == 6
+
+@pytest.mark.asyncio
+async def test_redelivery_requeues_only_expired_messages(queue_node: DistributedQueueNode):
+    topic = "deadline_topic"
+    await queue_node.publish_batch(topic, [{"n": i} for i in range(3)])
+    first = await queue_node.consume_batch(topic, 1)
+    assert await queue_node.redis_conn.zscore(queue_node.engine.DEADLINES_KEY, topic) is not None
+
+    assert await queue_node.requeue_expired() == 0
+    assert await queue_node.requeue_expired(time.time() + queue_node.REDELIVERY_TIMEOUT + 1) == 1
+    assert await queue_node.redis_conn.zscore(queue_node.engine.DEADLINES_KEY, topic) is None
+
+    redelivered = await queue_node.consume_batch(topic, 3)
+    assert [m['data']['n'] for m in redelivered['messages']] == [0, 1, 2]
+    assert redelivered['messages'][0]['id'] == first['messages'][0]['id']
+
+    await queue_node.acknowledge_batch(topic, [m['id'] for m in redelivered['messages']])
+    assert await queue_node.requeue_expired(time.time() + queue_node.REDELIVERY_TIMEOUT + 1) == 0
+    assert await queue_node.redis_conn.zcard(queue_node.engine.DEADLINES_KEY) == 0
+
+@pytest.mark.asyncio
+async def test_pending_structures_stay_bounded_under_sustained_load(queue_node: DistributedQueueNode):
+    topic = "sustained_topic"
+    _, meta_key, deadline_key = queue_node.engine.keys(topic)
+    unacked = []
+
+    for round_number in range(200):
+        await queue_node.publish_batch(topic, [{"round": round_number, "n": i} for i in range(25)])
+        consumed = await queue_node.consume_batch(topic, 25)
+        message_ids = [m['id'] for m in consumed['messages']]
+        unacked.append(message_ids.pop())
+        await queue_node.acknowledge_batch(topic, message_ids)
+
+        assert await queue_node.redis_conn.hlen(meta_key) == len(unacked)
+        assert await queue_node.redis_conn.zcard(deadline_key) == len(unacked)
+
+    for message_id in unacked:
+        assert (await queue_node.acknowledge(topic, message_id))['status'] == "ACK_RECEIVED"
+    assert await queue_node.redis_conn.hlen(meta_key) == 0
+    assert await queue_node.redis_conn.zcard(deadline_key) == 0
+    assert await queue_node.redis_conn.exists(f"{queue_node.engine.PENDING_PREFIX}{topic}", f"{queue_node.engine.QUEUE_PREFIX}{topic}") == 0
+
+    info = await queue_node.pending_info(topic)
+    assert info['pending'] == 0 and info['next_deadline'] is None
+
+@pytest.mark.asyncio
+async def test_stream_engine_publish_consume_ack(stream_node: DistributedQueueNode):
+    topic = "stream_topic"
+    pub_result = await stream_node.publish_batch(topic, [{"n": i} for i in range(5)])
+    assert pub_result['status'] == "SUCCESS"
+
+    consumed = await stream_node.consume_batch(topic, 3)
+    assert [m['data']['n'] for m in consumed['messages']] == [0, 1, 2]
+    assert (await stream_node.pending_info(topic))['pending'] == 3
+
+    ack_result = await stream_node.acknowledge_batch(topic, [m['id'] for m in consumed['messages']] + ["0-1"])
+    assert len(ack_result['acked']) == 3
+    assert ack_result['missing'] == ["0-1"]
+    assert (await stream_node.pending_info(topic))['pending'] == 0
+    assert await stream_node.redis_conn.xlen(stream_node.engine.key(topic)) == 2
+
+@pytest.mark.asyncio
+async def test_stream_engine_redelivers_with_autoclaim(stream_node: DistributedQueueNode):
+    topic = "stream_redeliver"
+    stream_node.engine.redelivery_timeout = 0.05
+    await stream_node.publish(topic, {"data": "lost_message"})
+    first = await stream_node.consume(topic)
+
+    assert await stream_node.requeue_expired() == 0
+    await asyncio.sleep(0.1)
+    assert await stream_node.requeue_expired() == 1
+    assert await stream_node.requeue_expired() == 0
+
+    redelivered = await stream_node.consume(topic)
+    assert redelivered['message']['id'] == first['message']['id']
+    assert (await stream_node.acknowledge(topic, first['message']['id']))['status'] == "ACK_RECEIVED"
+    assert (await stream_node.consume(topic))['status'] == "NO_MESSAGE"
+
+    await asyncio.sleep(0.1)
+    assert await stream_node.requeue_expired() == 0
+    assert await stream_node.redis_conn.zcard(stream_node.engine.DEADLINES_KEY) == 0
+
+@pytest.mark.asyncio
+async def test_long_poll_consume_wakes_on_publish(queue_node: DistributedQueueNode):
+    topic = "long_poll_topic"
+    assert (await queue_node.consume(topic, wait_ms=50))['status'] == "NO_MESSAGE"
+
+    started = time.monotonic()
+    waiting = asyncio.ensure_future(queue_node.consume_batch(topic, 10, wait_ms=5000))
+    await asyncio.sleep(0.05)
+    await queue_node.publish_batch(topic, [{"n": 1}, {"n": 2}])
+
+    result = await waiting
+    assert result['status'] == "MESSAGE_SENT"
+    assert [m['data']['n'] for m in result['messages']] == [1, 2]
+    assert time.monotonic() - started < 1.0
@@ -9,12 +9,11 @@ LOCK_NODES = {
     "node_lock_3": "http://localhost:8003",
 }
 
-def find_leader_port():
+def find_leader_port(lock_name="probe"):
     for node_id, url in LOCK_NODES.items():
         try:
-            response = requests.post(f"{url}/lock/acquire", json={"lock_name": "probe", "client_id": "TEST_PROBE", "timeout": 0.5}, timeout=0.5)
+            response = requests.get(f"{url}/lock/status", params={"lock_name": lock_name}, timeout=0.5)
             if response.status_code == 200 and response.json().get('success'):
-                requests.post(f"{url}/lock/release", json={"lock_name": "probe", "client_id": "TEST_PROBE"}, timeout=0.5)
                 return url, node_id
         except requests.exceptions.RequestException:
             continue
@@ -53,6 +52,21 @@ def test_02_raft_contention_and_linearizability(raft_leader):
 
     requests.post(f"{leader_url}/lock/release", json={"lock_name": "TestLock2", "client_id": "C1"})
 
+def test_02b_raft_status_read_reflects_holder():
+    leader_url, _ = find_leader_port("TestLock3")
+
+    requests.post(f"{leader_url}/lock/acquire", json={"lock_name": "TestLock3", "client_id": "C3", "lock_type": "exclusive"})
+
+    resp_status = requests.get(f"{leader_url}/lock/status", params={"lock_name": "TestLock3"})
+    assert resp_status.json()['success'] is True
+    assert resp_status.json()['held'] is True
+    assert resp_status.json()['holders'] == ["C3"]
+
+    resp_list = requests.get(f"{leader_url}/lock/list", params={"prefix": "TestLock"})
+    assert "TestLock3" in [lock['lock_name'] for lock in resp_list.json()['locks']]
+
+    requests.post(f"{leader_url}/lock/release", json={"lock_name": "TestLock3", "client_id": "C3"})
+
 @pytest.mark.skip(reason="Memerlukan eksekusi CLI Docker untuk menguji stop/start.")
 def test_03_raft_failover_and_consistency(raft_leader):
     pass
\ No newline at end of file
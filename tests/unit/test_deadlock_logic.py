@@ -1,5 +1,6 @@
 import pytest
 import time
+import asyncio
 from unittest.mock import MagicMock
 from src.nodes.lock_manager import DistributedLockManager
 from src.consensus.raft import RaftNode
@@ -9,39 +10,84 @@ def mock_lock_manager():
     raft_mock = MagicMock(spec=RaftNode)
     RaftStateMock = type('RaftStateMock', (object,), {'LEADER': 'leader'})
     raft_mock.state = RaftStateMock.LEADER
+    raft_mock.last_applied = 0
     
     lock_manager = DistributedLockManager(raft_mock)
     return lock_manager
 
+def hold_lock(lock_manager, lock_name, client_id, expiry):
+    lock_manager.apply_command({"type": "ACQUIRE", "lock_name": lock_name, "lock_type": "exclusive", "client_id": client_id, "expiry": expiry})
+
 @pytest.mark.asyncio
 async def test_deadlock_monitor_triggers_release(mock_lock_manager):
+    commit = asyncio.get_running_loop().create_future()
+    mock_lock_manager.raft_node.propose.return_value = (True, None, commit)
     expired_time = time.time() - 5
-    mock_lock_manager.locks["EXPIRED_LOCK"] = {
-        "type": "exclusive", 
-        "holders": ["Client_X"], 
-        "expiry": expired_time
-    }
+    hold_lock(mock_lock_manager, "EXPIRED_LOCK", "Client_X", expired_time)
     
-    await mock_lock_manager.deadlock_monitor()
+    mock_lock_manager.check_expired_locks()
     
-    mock_lock_manager.raft_node.submit_command.assert_called_once()
+    mock_lock_manager.raft_node.propose.assert_called_once()
     
-    args, _ = mock_lock_manager.raft_node.submit_command.call_args
+    args, _ = mock_lock_manager.raft_node.propose.call_args
     command = args[0]
     
     assert command['type'] == 'RELEASE'
     assert command['lock_name'] == 'EXPIRED_LOCK'
     assert command['client_id'] == 'SYSTEM_TIMEOUT'
+    assert command['expiry'] == expired_time
 
 @pytest.mark.asyncio
 async def test_deadlock_monitor_ignores_valid_lock(mock_lock_manager):
     valid_time = time.time() + 5 
-    mock_lock_manager.locks["VALID_LOCK"] = {
-        "type": "exclusive", 
-        "holders": ["Client_Y"], 
-        "expiry": valid_time
-    }
+    hold_lock(mock_lock_manager, "VALID_LOCK", "Client_Y", valid_time)
     
-    await mock_lock_manager.deadlock_monitor()
+    mock_lock_manager.check_expired_locks()
     
-    mock_lock_manager.raft_node.submit_command.assert_not_called()
\ No newline at end of file
+    mock_lock_manager.raft_node.propose.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_deadlock_monitor_releases_each_expiry_once(mock_lock_manager):
+    commit = asyncio.get_running_loop().create_future()
+    mock_lock_manager.raft_node.propose.return_value = (True, None, commit)
+    hold_lock(mock_lock_manager, "EXPIRED_LOCK", "Client_X", time.time() - 5)
+
+    mock_lock_manager.check_expired_locks()
+    mock_lock_manager.check_expired_locks()
+    assert mock_lock_manager.raft_node.propose.call_count == 1
+
+    commit.set_exception(RuntimeError("dropped"))
+    await asyncio.sleep(0)
+    mock_lock_manager.check_expired_locks()
+    assert mock_lock_manager.raft_node.propose.call_count == 2
+
+def test_stale_timeout_release_does_not_evict_new_holder(mock_lock_manager):
+    stale_expiry = time.time() - 5
+    hold_lock(mock_lock_manager, "L", "Client_X", stale_expiry)
+    mock_lock_manager.apply_command({"type": "RELEASE", "lock_name": "L", "client_id": "Client_X"})
+    hold_lock(mock_lock_manager, "L", "Client_Y", time.time() + 5)
+
+    mock_lock_manager.apply_command({"type": "RELEASE", "lock_name": "L", "client_id": "SYSTEM_TIMEOUT", "expiry": stale_expiry})
+
+    assert mock_lock_manager.locks["L"]['holders'] == ["Client_Y"]
+
+@pytest.mark.asyncio
+async def test_wait_for_cycle_aborts_the_waiter_that_closes_it(mock_lock_manager):
+    mock_lock_manager.is_leader = MagicMock(return_value=True)
+    mock_lock_manager.raft_node.propose.return_value = (True, None, asyncio.get_running_loop().create_future())
+    hold_lock(mock_lock_manager, "A", "C1", time.time() + 30)
+    hold_lock(mock_lock_manager, "B", "C2", time.time() + 30)
+
+    wait = {"type": "ACQUIRE", "lock_type": "exclusive", "expiry": time.time() + 30, "timestamp": time.time(), "wait": True}
+    mock_lock_manager.apply_command({**wait, "lock_name": "B", "client_id": "C1"})
+    await asyncio.sleep(0)
+    mock_lock_manager.raft_node.propose.assert_not_called()
+
+    mock_lock_manager.apply_command({**wait, "lock_name": "A", "client_id": "C2"})
+    await asyncio.sleep(0)
+    abort = mock_lock_manager.raft_node.propose.call_args.args[0]
+    assert (abort['type'], abort['lock_name'], abort['client_id']) == ('ABORT', 'A', 'C2')
+
+    mock_lock_manager.apply_command(abort)
+    assert mock_lock_manager.locks["A"]['waiters'] == []
+    assert not mock_lock_manager._waits_for_cycle("C1")
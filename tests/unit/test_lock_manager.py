@@ -0,0 +1,301 @@
+import time
+import asyncio
+from collections import deque
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from src.nodes.lock_manager import DistributedLockManager, LockOutcome
+
+@pytest.fixture
+def lock_manager():
+    return DistributedLockManager(raft_node=MagicMock())
+
+def acquire_cmd(lock_name, client_id, lock_type='exclusive'):
+    return {"type": "ACQUIRE", "lock_name": lock_name, "client_id": client_id, "lock_type": lock_type, "expiry": time.time() + 30}
+
+def test_apply_command_reports_grant_and_deny(lock_manager):
+    assert lock_manager.apply_command(acquire_cmd("L1", "C1")) == LockOutcome.GRANTED
+    assert lock_manager.apply_command(acquire_cmd("L1", "C2")) == LockOutcome.DENIED
+
+def test_apply_command_release_with_remaining_shared_holders(lock_manager):
+    lock_manager.apply_command(acquire_cmd("L1", "C1", 'shared'))
+    lock_manager.apply_command(acquire_cmd("L1", "C2", 'shared'))
+
+    assert lock_manager.apply_command({"type": "RELEASE", "lock_name": "L1", "client_id": "C1"}) == LockOutcome.RELEASED
+    assert lock_manager.locks["L1"]['holders'] == ["C2"]
+    assert lock_manager.apply_command({"type": "RELEASE", "lock_name": "L1", "client_id": "C1"}) == LockOutcome.NOT_HELD
+
+@pytest.mark.asyncio
+async def test_acquire_resolves_from_commit_outcome(lock_manager):
+    commit = asyncio.get_running_loop().create_future()
+    commit.set_result(LockOutcome.DENIED)
+    lock_manager.is_leader = MagicMock(return_value=True)
+    lock_manager.raft_node.propose.return_value = (True, 'n1', commit)
+
+    start = time.monotonic()
+    response = await lock_manager.acquire_lock("L1", "exclusive", "C1", timeout=10)
+
+    assert response == {"success": False, "error": "LOCK_DENIED"}
+    assert time.monotonic() - start < 1
+
+@pytest.mark.asyncio
+async def test_follower_forwards_acquire_to_leader(lock_manager):
+    lock_manager.is_leader = MagicMock(return_value=False)
+    lock_manager.raft_node.node_id = 'n2'
+    lock_manager.raft_node.leader_id = 'n1'
+    lock_manager.raft_node.comm.send_rpc = AsyncMock(return_value={"success": True, "message": "exclusive lock acquired"})
+
+    response = await lock_manager.acquire_lock("L1", "exclusive", "C1", timeout=2)
+
+    assert response['success'] is True
+    target, endpoint, payload = lock_manager.raft_node.comm.send_rpc.call_args.args
+    assert (target, endpoint) == ('n1', '/lock/acquire')
+    assert payload['forwarded'] is True
+
+@pytest.mark.asyncio
+async def test_forwarded_request_is_not_forwarded_again(lock_manager):
+    lock_manager.is_leader = MagicMock(return_value=False)
+    lock_manager.raft_node.leader_id = 'n1'
+    lock_manager.raft_node.comm.send_rpc = AsyncMock()
+
+    response = await lock_manager.release_lock("L1", "C1", forwarded=True)
+
+    assert response == {"success": False, "error": "NOT_LEADER", "leader_hint": 'n1'}
+    lock_manager.raft_node.comm.send_rpc.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_forwarded_wait_covers_leader_cancel_budget(lock_manager):
+    lock_manager.is_leader = MagicMock(return_value=False)
+    lock_manager.raft_node.node_id = 'n2'
+    lock_manager.raft_node.leader_id = 'n1'
+    lock_manager.raft_node.comm.send_rpc = AsyncMock(return_value={"success": False, "error": "LOCK_TIMEOUT"})
+
+    await lock_manager.acquire_lock("L1", "exclusive", "C1", timeout=10, wait=True)
+    assert lock_manager.raft_node.comm.send_rpc.call_args.kwargs['timeout'] == 10 + lock_manager.commit_grace + lock_manager.cancel_timeout + 1.0
+
+    await lock_manager.acquire_lock("L1", "exclusive", "C1", timeout=10)
+    assert lock_manager.raft_node.comm.send_rpc.call_args.kwargs['timeout'] == 10 + lock_manager.commit_grace + 1.0
+
+@pytest.mark.asyncio
+async def test_duplicate_wait_is_rejected_and_first_waiter_gets_grant(lock_manager):
+    lock_manager.is_leader = MagicMock(return_value=True)
+    queued = asyncio.get_running_loop().create_future()
+    queued.set_result(LockOutcome.QUEUED)
+    lock_manager.raft_node.propose.return_value = (True, None, queued)
+
+    first = asyncio.create_task(lock_manager.acquire_lock("L1", "exclusive", "C1", timeout=5, wait=True))
+    await asyncio.sleep(0)
+
+    assert await lock_manager.acquire_lock("L1", "exclusive", "C1", timeout=5, wait=True) == {"success": False, "error": "ALREADY_WAITING"}
+    lock_manager._grant_futures[("L1", "C1")].set_result(LockOutcome.GRANTED)
+    assert (await first)['success'] is True
+    assert lock_manager._grant_futures == {}
+
+def waiting_acquire(lock_name, client_id, lock_type='exclusive', now=None):
+    now = now or time.time()
+    return {"type": "ACQUIRE", "lock_name": lock_name, "client_id": client_id, "lock_type": lock_type, "expiry": now + 30, "timestamp": now, "wait": True}
+
+def test_release_grants_waiters_in_fifo_order_and_batches_readers(lock_manager):
+    lock_manager.apply_command(acquire_cmd("L1", "W1"))
+    for client_id, lock_type in [("R1", 'shared'), ("R2", 'shared'), ("W2", 'exclusive'), ("R3", 'shared')]:
+        assert lock_manager.apply_command(waiting_acquire("L1", client_id, lock_type)) == LockOutcome.QUEUED
+
+    lock_manager.apply_command({"type": "RELEASE", "lock_name": "L1", "client_id": "W1", "timestamp": time.time()})
+    assert lock_manager.locks["L1"]['type'] == 'shared'
+    assert lock_manager.locks["L1"]['holders'] == ["R1", "R2"]
+
+    lock_manager.apply_command({"type": "RELEASE", "lock_name": "L1", "client_id": "R1", "timestamp": time.time()})
+    lock_manager.apply_command({"type": "RELEASE", "lock_name": "L1", "client_id": "R2", "timestamp": time.time()})
+    assert lock_manager.locks["L1"]['holders'] == ["W2"]
+    assert [w['client_id'] for w in lock_manager.locks["L1"]['waiters']] == ["R3"]
+
+def test_shared_acquire_queues_behind_waiting_writer(lock_manager):
+    lock_manager.apply_command(acquire_cmd("L1", "R1", 'shared'))
+    lock_manager.apply_command(waiting_acquire("L1", "W1"))
+
+    assert lock_manager.apply_command(acquire_cmd("L1", "R2", 'shared')) == LockOutcome.DENIED
+
+def test_expired_and_cancelled_waiters_are_skipped(lock_manager):
+    now = time.time()
+    lock_manager.apply_command(acquire_cmd("L1", "W1"))
+    lock_manager.apply_command(waiting_acquire("L1", "STALE", now=now - 60))
+    lock_manager.apply_command(waiting_acquire("L1", "GONE"))
+    lock_manager.apply_command(waiting_acquire("L1", "NEXT"))
+
+    assert lock_manager.apply_command({"type": "CANCEL", "lock_name": "L1", "client_id": "GONE"}) == LockOutcome.CANCELLED
+    lock_manager.apply_command({"type": "RELEASE", "lock_name": "L1", "client_id": "SYSTEM_TIMEOUT", "timestamp": now})
+
+    assert lock_manager.locks["L1"]['holders'] == ["NEXT"]
+
+def open_session_cmd(session_id, now, ttl=10.0):
+    return {"type": "SESSION_OPEN", "session_id": session_id, "client_id": "W1", "ttl": ttl, "timestamp": now}
+
+def test_session_locks_outlive_their_own_expiry_until_session_expires(lock_manager):
+    now = time.time()
+    lock_manager.apply_command(open_session_cmd("S1", now - 20))
+    lock_manager.apply_command({"type": "ACQUIRE", "lock_name": "L1", "client_id": "W1", "lock_type": "exclusive", "expiry": now - 15, "timestamp": now - 20, "session_id": "S1"})
+    lock_manager.apply_command({"type": "KEEPALIVE", "session_ids": ["S1"], "timestamp": now - 5})
+    lock_manager.raft_node.propose.return_value = (True, None, MagicMock())
+
+    assert lock_manager.check_expired_locks(now) == 0
+    assert lock_manager.check_expired_locks(now + 10) == 1
+    command = lock_manager.raft_node.propose.call_args.args[0]
+    assert command['type'] == 'SESSION_EXPIRE'
+
+    lock_manager.apply_command(command)
+    assert "L1" not in lock_manager.locks
+    assert "S1" not in lock_manager.sessions
+
+def test_keepalive_batch_renews_only_live_sessions(lock_manager):
+    now = time.time()
+    lock_manager.apply_command(open_session_cmd("S1", now))
+
+    expiries = lock_manager.apply_command({"type": "KEEPALIVE", "session_ids": ["S1", "GONE"], "timestamp": now + 5})
+
+    assert expiries == {"S1": now + 15}
+
+def test_acquire_many_is_all_or_nothing(lock_manager):
+    lock_manager.apply_command(acquire_cmd("B", "OTHER"))
+    batch = DistributedLockManager.canonical_lock_set([{"lock_name": "C"}, {"lock_name": "A"}, {"lock_name": "B"}])
+    assert [lock['lock_name'] for lock in batch] == ["A", "B", "C"]
+
+    command = {"type": "ACQUIRE_MANY", "locks": batch, "client_id": "C1", "expiry": time.time() + 30, "timestamp": time.time()}
+    assert lock_manager.apply_command(command) == LockOutcome.DENIED
+    assert set(lock_manager.locks) == {"B"}
+
+    lock_manager.apply_command({"type": "RELEASE", "lock_name": "B", "client_id": "OTHER"})
+    assert lock_manager.apply_command(command) == LockOutcome.GRANTED
+    assert all(lock_manager.locks[name]['holders'] == ["C1"] for name in "ABC")
+
+    assert lock_manager.apply_command({"type": "RELEASE_MANY", "lock_names": ["A", "B", "C"], "client_id": "C1"}) == LockOutcome.RELEASED
+    assert lock_manager.locks == {}
+
+def test_canonical_lock_set_keeps_strongest_mode():
+    batch = DistributedLockManager.canonical_lock_set([{"lock_name": "A", "lock_type": "shared"}, {"lock_name": "A", "lock_type": "exclusive"}, {"lock_name": "A", "lock_type": "shared"}])
+    assert batch == [{"lock_name": "A", "lock_type": "exclusive"}]
+
+def test_path_acquire_takes_intention_locks_on_ancestors(lock_manager):
+    assert lock_manager.apply_command(acquire_cmd("t1/orders/7", "W1")) == LockOutcome.GRANTED
+    assert lock_manager.apply_command(acquire_cmd("t1/orders/8", "W2")) == LockOutcome.GRANTED
+    assert lock_manager.apply_command(acquire_cmd("t1/invoices", "R1", 'shared')) == LockOutcome.GRANTED
+    assert lock_manager.locks["t1"]['modes'] == ['IX', 'IX', 'IS']
+    assert lock_manager.locks["t1/orders"]['holders'] == ["W1", "W2"]
+
+    assert lock_manager.apply_command(acquire_cmd("t1", "BULK")) == LockOutcome.DENIED
+    assert lock_manager.apply_command(acquire_cmd("t1/orders", "SCAN", 'shared')) == LockOutcome.DENIED
+    assert lock_manager.apply_command(acquire_cmd("t1", "AUDIT", 'IS')) == LockOutcome.GRANTED
+
+    for client_id, name in [("W1", "t1/orders/7"), ("W2", "t1/orders/8")]:
+        assert lock_manager.apply_command({"type": "RELEASE", "lock_name": name, "client_id": client_id}) == LockOutcome.RELEASED
+    assert "t1/orders" not in lock_manager.locks
+    assert lock_manager.locks["t1"]['holders'] == ["R1", "AUDIT"]
+
+def test_coarse_lock_covers_subtree_and_queued_leaf_waits_on_ancestor(lock_manager):
+    assert lock_manager.apply_command(acquire_cmd("t1", "BULK")) == LockOutcome.GRANTED
+    assert lock_manager.apply_command(waiting_acquire("t1/orders/7", "W1")) == LockOutcome.QUEUED
+    assert lock_manager.locks["t1"]['waiters'][0]['target'] == "t1/orders/7"
+    assert "t1/orders/7" not in lock_manager.locks
+
+    lock_manager.apply_command({"type": "RELEASE", "lock_name": "t1", "client_id": "BULK"})
+    assert lock_manager.locks["t1"]['modes'] == ['IX']
+    assert lock_manager.locks["t1/orders/7"]['holders'] == ["W1"]
+
+def test_six_lets_intention_readers_in_but_blocks_writers(lock_manager):
+    assert lock_manager.apply_command(acquire_cmd("t1", "OWNER", 'SIX')) == LockOutcome.GRANTED
+    assert lock_manager.apply_command(acquire_cmd("t1/a", "OWNER")) == LockOutcome.GRANTED
+    assert lock_manager.apply_command(acquire_cmd("t1/b", "R1", 'shared')) == LockOutcome.GRANTED
+    assert lock_manager.apply_command(acquire_cmd("t1/c", "W1")) == LockOutcome.DENIED
+    assert lock_manager.locks["t1"]['type'] == 'SIX'
+
+def test_canonical_lock_set_combines_intention_modes():
+    batch = DistributedLockManager.canonical_lock_set([{"lock_name": "A", "lock_type": "shared"}, {"lock_name": "A", "lock_type": "IX"}])
+    assert batch == [{"lock_name": "A", "lock_type": "SIX"}]
+
+def test_watchers_receive_grant_release_and_expiry_events(lock_manager):
+    events = asyncio.Queue()
+    lock_manager.watch(events, ["L1"], ["t1/"])
+    lock_manager.apply_command(acquire_cmd("L1", "C1"))
+    lock_manager.apply_command(acquire_cmd("other", "C1"))
+    lock_manager.apply_command({"type": "RELEASE", "lock_name": "L1", "client_id": "C1"})
+    lock_manager.apply_command(acquire_cmd("t1/a", "C2", 'shared'))
+    expiry = lock_manager.locks["t1/a"]['expiry']
+    lock_manager.apply_command({"type": "RELEASE", "lock_name": "t1/a", "client_id": "SYSTEM_TIMEOUT", "expiry": expiry})
+
+    received = [events.get_nowait() for _ in range(events.qsize())]
+    assert [(e['event'], e['lock_name'], e['mode']) for e in received] == [("granted", "L1", "X"), ("released", "L1", "X"), ("granted", "t1/a", "S"), ("expired", "t1/a", "S")]
+
+    lock_manager.unwatch(events)
+    lock_manager.apply_command(acquire_cmd("L1", "C1"))
+    assert events.empty()
+
+def test_slow_watcher_is_dropped_with_overflow_event(lock_manager):
+    events = asyncio.Queue(maxsize=2)
+    lock_manager.watch(events, [], [""])
+    for name in "ABC":
+        lock_manager.apply_command(acquire_cmd(name, "C1"))
+    assert events.get_nowait()['event'] == "overflow"
+    assert events.empty()
+    assert lock_manager._watchers == []
+
+def test_follower_expiry_heap_stays_bounded_under_churn(lock_manager):
+    lock_manager.apply_command(acquire_cmd("held", "C1"))
+    for i in range(1000):
+        lock_manager.apply_command(acquire_cmd(f"L{i}", "C2"))
+        lock_manager.apply_command({"type": "RELEASE", "lock_name": f"L{i}", "client_id": "C2"})
+
+    lock_manager.compact_heaps()
+
+    assert lock_manager._expiry_heap == [(lock_manager.locks["held"]['expiry'], "held")]
+
+def test_keepalives_do_not_grow_session_heap(lock_manager):
+    now = time.time()
+    lock_manager.apply_command(open_session_cmd("S1", now))
+    for i in range(1000):
+        lock_manager.apply_command({"type": "KEEPALIVE", "session_ids": ["S1"], "timestamp": now + i * 0.2})
+
+    lock_manager.compact_heaps()
+
+    assert lock_manager._session_heap == [(lock_manager.sessions["S1"]['expiry'], "S1")]
+
+def test_repeat_acquire_is_idempotent_and_upgrades_in_place(lock_manager):
+    assert lock_manager.apply_command(acquire_cmd("L1", "C1")) == LockOutcome.GRANTED
+    assert lock_manager.apply_command(acquire_cmd("L1", "C1")) == LockOutcome.GRANTED
+    assert lock_manager.locks["L1"]['holders'] == ["C1"]
+    assert lock_manager.apply_command({"type": "RELEASE", "lock_name": "L1", "client_id": "C1"}) == LockOutcome.RELEASED
+    assert "L1" not in lock_manager.locks
+
+    assert lock_manager.apply_command(acquire_cmd("t1/a", "C1", 'shared')) == LockOutcome.GRANTED
+    assert lock_manager.apply_command(acquire_cmd("t1/a", "C1")) == LockOutcome.GRANTED
+    assert lock_manager.locks["t1/a"]['modes'] == ['X']
+    assert lock_manager.locks["t1"]['modes'] == ['IX']
+    assert lock_manager.apply_command({"type": "RELEASE", "lock_name": "t1/a", "client_id": "C1"}) == LockOutcome.RELEASED
+    assert lock_manager.locks == {}
+
+def test_release_removes_explicit_hold_and_keeps_own_intentions(lock_manager):
+    assert lock_manager.apply_command(acquire_cmd("t1", "C1")) == LockOutcome.GRANTED
+    assert lock_manager.apply_command(acquire_cmd("t1/x", "C1")) == LockOutcome.GRANTED
+    assert lock_manager.apply_command({"type": "RELEASE", "lock_name": "t1", "client_id": "C1"}) == LockOutcome.RELEASED
+
+    assert lock_manager.locks["t1"]['modes'] == ['IX']
+    assert lock_manager.apply_command({"type": "RELEASE", "lock_name": "t1", "client_id": "C1"}) == LockOutcome.NOT_HELD
+    assert lock_manager.apply_command(acquire_cmd("t1/y", "C2")) == LockOutcome.GRANTED
+    assert lock_manager.apply_command(acquire_cmd("t1/x", "C2")) == LockOutcome.DENIED
+
+def test_events_since_replays_history_and_flags_gaps(lock_manager):
+    lock_manager._event_history = deque(maxlen=5)
+    for index, name in enumerate(["t1/a", "other", "t1/b", "t1/c"], start=1):
+        lock_manager.raft_node.last_applied = index
+        lock_manager.apply_command(acquire_cmd(name, "C1"))
+
+    assert [event['lock_name'] for event in lock_manager.events_since(2, [], ["t1/"])] == ["t1/b", "t1/c"]
+    assert lock_manager.events_since(4, [], ["t1/"]) == []
+    assert lock_manager.events_since(0, [], ["t1/"]) is None
+
+def test_timeout_release_drops_ancestor_intentions(lock_manager):
+    now = time.time()
+    lock_manager.apply_command({"type": "ACQUIRE", "lock_name": "t1/a", "client_id": "C1", "lock_type": "exclusive", "expiry": now + 1, "timestamp": now})
+    lock_manager.apply_command(acquire_cmd("t1/b", "C2"))
+    lock_manager.apply_command({"type": "RELEASE", "lock_name": "t1/a", "client_id": "SYSTEM_TIMEOUT", "expiry": now + 1, "timestamp": now + 2})
+    lock_manager.apply_command({"type": "RELEASE", "lock_name": "t1/b", "client_id": "C2"})
+
+    assert lock_manager.locks == {}
+    assert lock_manager.apply_command(acquire_cmd("t1", "C3")) == LockOutcome.GRANTED
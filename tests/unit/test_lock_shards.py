@@ -0,0 +1,114 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from src.nodes.lock_shards import LockShardRouter
+from src.consensus.raft import RaftState
+from main import format_raft_group_metrics
+
+@pytest.fixture
+def router():
+    groups = {}
+    for group_id in LockShardRouter.group_ids(4):
+        manager = MagicMock()
+        manager.raft_node.node_id = 'n1'
+        manager.raft_node.leader_id = 'n1'
+        manager.list_locks = AsyncMock(return_value={"success": True, "prefix": "", "locks": [{"lock_name": f"lock-{group_id}"}]})
+        groups[group_id] = manager
+    return LockShardRouter(groups)
+
+def test_preferred_leaders_are_spread_across_nodes():
+    nodes = ['node_lock_3', 'node_lock_1', 'node_lock_2']
+    leaders = [LockShardRouter.preferred_leader(group_id, nodes) for group_id in LockShardRouter.group_ids(6)]
+    assert leaders == ['node_lock_1', 'node_lock_2', 'node_lock_3'] * 2
+
+def test_lock_names_route_to_a_stable_group(router):
+    groups = {router.group_for(f"lock{i}") for i in range(200)}
+    assert groups == set(router.groups)
+    assert router.group_for("orders") == router.group_for("orders")
+
+@pytest.mark.asyncio
+async def test_list_locks_merges_all_groups(router):
+    response = await router.list_locks()
+    assert response['success'] is True
+    assert [lock['lock_name'] for lock in response['locks']] == ['lock-g0', 'lock-g1', 'lock-g2', 'lock-g3']
+
+@pytest.mark.asyncio
+async def test_list_locks_forwards_groups_led_elsewhere(router):
+    remote = router.groups['g2']
+    remote.raft_node.leader_id = 'n2'
+    remote.list_locks.return_value = {"success": False, "error": "NOT_LEADER", "leader_hint": 'n2'}
+    remote.raft_node.comm.send_get_rpc = AsyncMock(return_value={"success": True, "locks": [{"lock_name": "remote"}]})
+
+    response = await router.list_locks()
+
+    assert 'remote' in [lock['lock_name'] for lock in response['locks']]
+    remote.raft_node.comm.send_get_rpc.assert_awaited_once_with('n2', '/lock/list', {"prefix": "", "group_id": 'g2'}, timeout=2.0)
+
+@pytest.mark.asyncio
+async def test_status_and_holders_forward_to_group_leader(router):
+    manager = router.manager_for("orders")
+    manager.raft_node.leader_id = 'n2'
+    manager.get_lock_status = AsyncMock(return_value={"success": False, "error": "NOT_LEADER", "leader_hint": 'n2'})
+    manager.list_holders = AsyncMock(return_value={"success": False, "error": "NOT_LEADER", "leader_hint": 'n2'})
+    manager.raft_node.comm.send_get_rpc = AsyncMock(return_value={"success": True, "lock_name": "orders", "holders": ["C1"]})
+
+    assert (await router.get_lock_status("orders"))['holders'] == ["C1"]
+    manager.raft_node.comm.send_get_rpc.assert_awaited_with('n2', '/lock/status', {"lock_name": "orders", "forwarded": "true"}, timeout=2.0)
+    assert (await router.list_holders("orders"))['holders'] == ["C1"]
+    manager.raft_node.comm.send_get_rpc.assert_awaited_with('n2', '/lock/holders', {"lock_name": "orders", "forwarded": "true"}, timeout=2.0)
+
+    assert (await router.get_lock_status("orders", forwarded=True))['error'] == "NOT_LEADER"
+    assert manager.raft_node.comm.send_get_rpc.await_count == 2
+
+def test_hash_tag_colocates_lock_names(router):
+    assert LockShardRouter.routing_key("{tenant42}/orders") == "tenant42"
+    assert router.group_for("{tenant42}/orders") == router.group_for("{tenant42}/invoices")
+    assert LockShardRouter.routing_key("plain{}") == "plain{}"
+
+def test_path_names_route_by_root_segment(router):
+    assert LockShardRouter.routing_key("tenant7/orders/42") == "tenant7"
+    assert LockShardRouter.routing_key("/tenant7/orders") == "tenant7"
+    assert router.group_for("tenant7") == router.group_for("tenant7/orders/42")
+
+@pytest.mark.asyncio
+async def test_cross_group_batch_rolls_back_acquired_groups(router):
+    names = {}
+    for i in range(100):
+        names.setdefault(router.group_for(f"lock{i}"), f"lock{i}")
+    first, second = sorted(names)[:2]
+    for manager in router.groups.values():
+        manager.release_many = AsyncMock(return_value={"success": True})
+    router.groups[first].acquire_many = AsyncMock(return_value={"success": True})
+    router.groups[second].acquire_many = AsyncMock(return_value={"success": False, "error": "LOCK_DENIED"})
+
+    response = await router.acquire_many([{"lock_name": names[second]}, {"lock_name": names[first]}], "C1")
+
+    assert response['error'] == "LOCK_DENIED"
+    router.groups[first].release_many.assert_awaited_once_with([names[first]], "C1", False)
+
+def test_watch_cursor_and_missed_events_cover_watched_groups(router):
+    group_id = router.group_for("orders")
+    for gid, manager in router.groups.items():
+        manager.applied_index.return_value = 7
+        manager.events_since.return_value = [{"lock_name": "orders", "group_id": gid, "index": 8}]
+
+    assert router.watch_cursor(["orders"], []) == {group_id: 7}
+    assert router.events_since({}, ["orders"], []) == []
+    assert router.events_since({group_id: 5}, ["orders"], []) == [{"lock_name": "orders", "group_id": group_id, "index": 8}]
+
+    router.groups[group_id].events_since.return_value = None
+    assert router.events_since({group_id: 5}, ["orders"], []) is None
+
+def test_raft_metrics_are_labelled_per_group(router):
+    for group_id, manager in router.groups.items():
+        manager.raft_node.state = RaftState.LEADER if group_id == 'g1' else RaftState.FOLLOWER
+        manager.raft_node.current_term = 4
+        manager.raft_node.commit_index = 10
+        manager.raft_node.snapshot_index = 0
+        manager.raft_node.log = []
+
+    lines = format_raft_group_metrics('n1', router).splitlines()
+
+    assert 'raft_state_info{node_id="n1", group="g1", raft_state="leader"} 1' in lines
+    assert 'raft_is_leader{node_id="n1", group="g0"} 0' in lines
+    assert 'commit_index{node_id="n1", group="g3"} 10' in lines
+    assert 'term{node_id="n1", group="g2"} 4' in lines
@@ -0,0 +1,20 @@
+from src.consensus.log_entry import LogEntry, encode_append_entries, decode_append_entries
+
+def test_entry_encodes_command_once():
+    entry = LogEntry.from_command(2, {"type": "ACQUIRE", "lock_name": "L"})
+
+    assert isinstance(entry.payload, bytes)
+    assert entry.command() == {"type": "ACQUIRE", "lock_name": "L"}
+
+def test_append_entries_frame_round_trip():
+    entries = [LogEntry.from_command(1, {"type": "NOOP"}), LogEntry(2, b'{"type":"RELEASE"}')]
+    payload = {'term': 2, 'leader_id': 'n1', 'prev_log_index': 4, 'prev_log_term': 1, 'entries': entries, 'leader_commit': 3}
+
+    decoded = decode_append_entries(encode_append_entries(payload))
+
+    assert decoded == payload
+
+def test_empty_heartbeat_frame():
+    payload = {'term': 1, 'leader_id': 'n1', 'prev_log_index': 0, 'prev_log_term': 0, 'entries': [], 'leader_commit': 0}
+
+    assert decode_append_entries(encode_append_entries(payload))['entries'] == []
@@ -1,6 +1,9 @@
+import time
+import asyncio
 import pytest
-from unittest.mock import MagicMock
-from src.consensus.raft import RaftNode 
+from unittest.mock import MagicMock, AsyncMock
+from src.consensus.raft import RaftNode, RaftState, ProposalDroppedError, ReplicationMode
+from src.consensus.log_entry import LogEntry
 from src.communication.message_passing import NodeCommunication
 
 @pytest.fixture
@@ -9,7 +12,7 @@ def mock_raft_node():
     comm = MagicMock(spec=NodeCommunication)
     lock_manager = MagicMock()
     node = RaftNode('n1', peers, comm, lock_manager)
-    node.log = [(1, 'cmd1'), (1, 'cmd2'), (2, 'cmd3')]
+    node.log = [LogEntry(1, b'cmd1'), LogEntry(1, b'cmd2'), LogEntry(2, b'cmd3')]
     node.current_term = 2
     return node
 
@@ -25,4 +28,251 @@ def test_log_is_at_least_up_to_date_term_check(mock_raft_node):
 def test_log_is_at_least_up_to_date_length_check(mock_raft_node):
     assert mock_raft_node._log_is_at_least_up_to_date(candidate_last_index=5, candidate_last_term=2) is True
     
-    assert mock_raft_node._log_is_at_least_up_to_date(candidate_last_index=1, candidate_last_term=2) is False
\ No newline at end of file
+    assert mock_raft_node._log_is_at_least_up_to_date(candidate_last_index=1, candidate_last_term=2) is False
+
+def test_build_append_entries_respects_entry_limit(mock_raft_node):
+    mock_raft_node.log = [LogEntry(2, f'cmd{i}'.encode()) for i in range(10)]
+    mock_raft_node.max_batch_entries = 4
+    mock_raft_node.next_index['n2'] = 3
+
+    payload, count = mock_raft_node._build_append_entries('n2')
+
+    assert count == 4
+    assert payload['prev_log_index'] == 2
+    assert payload['prev_log_term'] == 2
+    assert len(payload['entries']) == 4
+
+def test_build_append_entries_respects_byte_limit(mock_raft_node):
+    mock_raft_node.log = [LogEntry(2, b'x' * 100) for _ in range(10)]
+    mock_raft_node.max_batch_bytes = 250
+    mock_raft_node.next_index['n2'] = 1
+
+    _, count = mock_raft_node._build_append_entries('n2')
+
+    assert count == 2
+
+
+def test_build_append_entries_backoff_probe_is_empty(mock_raft_node):
+    mock_raft_node.next_index['n2'] = 2
+
+    payload, count = mock_raft_node._build_append_entries('n2', probe=True)
+
+    assert count == 0
+    assert payload['entries'] == []
+    assert payload['prev_log_index'] == 1
+    assert payload['prev_log_term'] == 1
+
+async def _run_replicator_window(node, mode, window):
+    node.state = RaftState.LEADER
+    node.log = [LogEntry(2, f'cmd{i}'.encode()) for i in range(10)]
+    node.max_batch_entries = 1
+    node.replication_mode['n2'] = mode
+    gate = asyncio.Event()
+    window_full = asyncio.Event()
+
+    async def blocked(*args):
+        if node._send_append_rpc.call_count == window:
+            window_full.set()
+        await gate.wait()
+        return {'term': 2, 'success': True}
+    node._send_append_rpc = AsyncMock(side_effect=blocked)
+
+    replicator = asyncio.create_task(node._replicate_to_peer('n2', 2))
+    await asyncio.wait_for(window_full.wait(), timeout=5)
+    await asyncio.sleep(0)
+    sent = [call.args[1]['prev_log_index'] for call in node._send_append_rpc.call_args_list]
+
+    replicator.cancel()
+    node.state = RaftState.FOLLOWER
+    gate.set()
+    await asyncio.sleep(0)
+    return sent
+
+@pytest.mark.asyncio
+async def test_replicator_pipelines_up_to_max_inflight(mock_raft_node):
+    sent = await _run_replicator_window(mock_raft_node, ReplicationMode.PIPELINE, mock_raft_node.max_inflight)
+
+    assert sent == [0, 1, 2, 3]
+    assert mock_raft_node.next_index['n2'] == 5
+
+@pytest.mark.asyncio
+async def test_replicator_probe_sends_one_at_a_time(mock_raft_node):
+    sent = await _run_replicator_window(mock_raft_node, ReplicationMode.PROBE, 1)
+
+    assert sent == [0]
+    assert mock_raft_node.next_index['n2'] == 2
+
+@pytest.mark.asyncio
+async def test_send_append_entries_mode_transitions(mock_raft_node):
+    mock_raft_node.state = RaftState.LEADER
+    mock_raft_node.log = [LogEntry(2, f'cmd{i}'.encode()) for i in range(10)]
+
+    mock_raft_node.next_index['n2'] = 7
+    payload, count = mock_raft_node._build_append_entries('n2')
+    mock_raft_node.next_index['n2'] = 11
+    mock_raft_node._send_append_rpc = AsyncMock(return_value={'error': 'timeout'})
+    await mock_raft_node._send_append_entries('n2', payload, count)
+    assert mock_raft_node.replication_mode['n2'] == ReplicationMode.BACKOFF
+    assert mock_raft_node.next_index['n2'] == 7
+
+    payload, count = mock_raft_node._build_append_entries('n2', probe=True)
+    mock_raft_node._send_append_rpc = AsyncMock(return_value={'term': 2, 'success': False, 'conflict_index': 4, 'conflict_term': None})
+    await mock_raft_node._send_append_entries('n2', payload, count)
+    assert mock_raft_node.replication_mode['n2'] == ReplicationMode.PROBE
+    assert mock_raft_node.next_index['n2'] == 4
+
+    payload, count = mock_raft_node._build_append_entries('n2')
+    mock_raft_node.next_index['n2'] = payload['prev_log_index'] + count + 1
+    mock_raft_node._send_append_rpc = AsyncMock(return_value={'term': 2, 'success': True})
+    await mock_raft_node._send_append_entries('n2', payload, count)
+    assert mock_raft_node.replication_mode['n2'] == ReplicationMode.PIPELINE
+    assert mock_raft_node.match_index['n2'] == 10
+    assert mock_raft_node.next_index['n2'] == 11
+
+    mock_raft_node._send_append_rpc = AsyncMock(return_value={'term': 2, 'success': False, 'conflict_index': 12, 'conflict_term': None})
+    await mock_raft_node._send_append_entries('n2', payload, count)
+    assert mock_raft_node.replication_mode['n2'] == ReplicationMode.PROBE
+    assert mock_raft_node.next_index['n2'] == 11
+
+
+@pytest.mark.asyncio
+async def test_propose_future_resolves_with_apply_result(mock_raft_node):
+    mock_raft_node.state = RaftState.LEADER
+    mock_raft_node.lock_manager.apply_command.return_value = True
+
+    success, _, future = mock_raft_node.propose({"type": "ACQUIRE", "lock_name": "L"})
+    assert success is True
+    assert not future.done()
+
+    mock_raft_node.commit_index = len(mock_raft_node.log)
+    await mock_raft_node._apply_log()
+
+    assert future.result() is True
+
+@pytest.mark.asyncio
+async def test_propose_future_dropped_when_entry_overwritten(mock_raft_node):
+    mock_raft_node.state = RaftState.LEADER
+    _, _, future = mock_raft_node.propose({"type": "ACQUIRE", "lock_name": "L"})
+
+    mock_raft_node.log[-1] = LogEntry(3, b'{}')
+    mock_raft_node.commit_index = len(mock_raft_node.log)
+    await mock_raft_node._apply_log()
+
+    with pytest.raises(ProposalDroppedError):
+        future.result()
+
+@pytest.mark.asyncio
+async def test_take_snapshot_truncates_log_prefix(mock_raft_node):
+    mock_raft_node.lock_manager.snapshot.return_value = {"locks": {}}
+    mock_raft_node.last_applied = 2
+
+    await mock_raft_node._take_snapshot()
+
+    assert mock_raft_node.snapshot_index == 2
+    assert mock_raft_node.snapshot_term == 1
+    assert mock_raft_node.log == [LogEntry(2, b'cmd3')]
+    assert mock_raft_node._last_log_index() == 3
+    assert mock_raft_node._term_at(3) == 2
+    assert mock_raft_node._log_is_at_least_up_to_date(candidate_last_index=3, candidate_last_term=2) is True
+
+@pytest.mark.asyncio
+async def test_append_entries_rejection_returns_conflict_hints(mock_raft_node):
+    payload = {'term': 3, 'leader_id': 'n2', 'prev_log_index': 3, 'prev_log_term': 3, 'entries': [], 'leader_commit': 0}
+
+    result = await mock_raft_node.handle_append_entries(payload)
+    assert result['success'] is False
+    assert result['conflict_term'] == 2
+    assert result['conflict_index'] == 3
+
+    payload['prev_log_index'] = 10
+    result = await mock_raft_node.handle_append_entries(payload)
+    assert result['conflict_term'] is None
+    assert result['conflict_index'] == 4
+
+def test_leader_skips_whole_term_on_conflict(mock_raft_node):
+    mock_raft_node.log = [LogEntry(term, b'{}') for term in (1, 1, 1, 4, 4)]
+
+    assert mock_raft_node._next_index_from_conflict({'conflict_index': 2, 'conflict_term': 1}, 5) == 4
+    assert mock_raft_node._next_index_from_conflict({'conflict_index': 2, 'conflict_term': 3}, 5) == 2
+    assert mock_raft_node._next_index_from_conflict({'conflict_index': 3, 'conflict_term': None}, 5) == 3
+
+def test_lease_requires_recent_quorum_ack(mock_raft_node):
+    assert mock_raft_node._lease_valid() is False
+
+    mock_raft_node._record_ack('n2', time.monotonic())
+    assert mock_raft_node._lease_valid() is True
+
+    mock_raft_node._peer_ack_times['n2'] = time.monotonic() - mock_raft_node.election_timeout_min
+    assert mock_raft_node._lease_valid() is False
+
+@pytest.mark.asyncio
+async def test_read_index_skips_lease_during_transfer(mock_raft_node):
+    mock_raft_node.state = RaftState.LEADER
+    mock_raft_node.lease_reads = True
+    mock_raft_node._leader_ready = asyncio.get_running_loop().create_future()
+    mock_raft_node._leader_ready.set_result(True)
+    mock_raft_node._record_ack('n2', time.monotonic())
+    mock_raft_node._confirm_leadership = AsyncMock(return_value=False)
+
+    assert await mock_raft_node.read_index() == (True, None)
+    mock_raft_node._confirm_leadership.assert_not_called()
+
+    mock_raft_node._transfer_target = 'n2'
+    assert (await mock_raft_node.read_index())[0] is False
+    mock_raft_node._confirm_leadership.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_transfer_blocks_proposals_and_sends_timeout_now(mock_raft_node):
+    mock_raft_node.state = RaftState.LEADER
+    mock_raft_node.match_index = {'n2': 3, 'n3': 1}
+
+    async def deposed(*args, **kwargs):
+        assert mock_raft_node.propose({"type": "NOOP"})[:2] == (False, 'n2')
+        await mock_raft_node._step_down(3)
+        return {'term': 3, 'success': True}
+    mock_raft_node.comm.send_rpc = AsyncMock(side_effect=deposed)
+
+    result = await mock_raft_node.transfer_leadership()
+
+    assert result['success'] is True
+    assert result['target_id'] == 'n2'
+    assert mock_raft_node.comm.send_rpc.call_args.args[1] == '/raft/timeout_now'
+
+@pytest.mark.asyncio
+async def test_transfer_vote_bypasses_leader_stickiness(mock_raft_node):
+    mock_raft_node.leader_id = 'n2'
+    mock_raft_node.last_contact = time.time()
+    vote = {'term': 3, 'candidate_id': 'n3', 'last_log_index': 3, 'last_log_term': 2}
+
+    assert (await mock_raft_node.handle_request_vote(vote))['vote_granted'] is False
+
+    vote['leadership_transfer'] = True
+    assert (await mock_raft_node.handle_request_vote(vote))['vote_granted'] is True
+
+@pytest.mark.asyncio
+async def test_pre_vote_does_not_change_voter_term(mock_raft_node):
+    pre_vote = {'term': 5, 'candidate_id': 'n3', 'last_log_index': 3, 'last_log_term': 2}
+
+    result = await mock_raft_node.handle_pre_vote(pre_vote)
+
+    assert result['vote_granted'] is True
+    assert mock_raft_node.current_term == 2
+    assert mock_raft_node.voted_for is None
+
+@pytest.mark.asyncio
+async def test_election_increments_term_once(mock_raft_node):
+    mock_raft_node.comm.broadcast_rpc = AsyncMock(return_value={'n2': {'term': 3, 'vote_granted': True}})
+    mock_raft_node._leader_loop = AsyncMock()
+
+    await mock_raft_node._transition_to_candidate()
+    await mock_raft_node._run_election()
+
+    assert mock_raft_node.current_term == 3
+    assert mock_raft_node.state == RaftState.LEADER
+
+def test_check_quorum_fails_without_recent_majority_ack(mock_raft_node):
+    mock_raft_node._leader_since = time.monotonic() - 10
+    assert mock_raft_node._check_quorum() is False
+
+    mock_raft_node._record_ack('n3', time.monotonic())
+    assert mock_raft_node._check_quorum() is True
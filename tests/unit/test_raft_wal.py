@@ -0,0 +1,98 @@
+import os
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch
+from src.consensus.wal import WriteAheadLog
+from src.consensus.log_entry import LogEntry
+
+@pytest.mark.asyncio
+async def test_append_and_reload_entries(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.load()
+    wal.append(1, [LogEntry(1, b'{"type": "ACQUIRE"}'), LogEntry(1, b'{"type": "RELEASE"}')])
+    await wal.save_meta(3, 'n2')
+    wal.close()
+
+    meta, snapshot, entries = WriteAheadLog(str(tmp_path)).load()
+
+    assert meta == {'term': 3, 'voted_for': 'n2'}
+    assert snapshot is None
+    assert entries == [LogEntry(1, b'{"type": "ACQUIRE"}'), LogEntry(1, b'{"type": "RELEASE"}')]
+
+def test_truncate_record_discards_suffix(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.load()
+    wal.append(1, [LogEntry(1, b'a'), LogEntry(1, b'b'), LogEntry(1, b'c')])
+    wal.truncate_from(2)
+    wal.append(2, [LogEntry(2, b'x')])
+    wal.close()
+
+    _, _, entries = WriteAheadLog(str(tmp_path)).load()
+
+    assert entries == [LogEntry(1, b'a'), LogEntry(2, b'x')]
+
+def test_torn_tail_is_ignored(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.load()
+    wal.append(1, [LogEntry(1, b'a'), LogEntry(1, b'b')])
+    wal.close()
+
+    segment = [n for n in os.listdir(tmp_path) if n.endswith(WriteAheadLog.SEGMENT_SUFFIX)][0]
+    with open(tmp_path / segment, 'r+b') as f:
+        f.truncate(os.path.getsize(tmp_path / segment) - 3)
+
+    _, _, entries = WriteAheadLog(str(tmp_path)).load()
+
+    assert entries == [LogEntry(1, b'a')]
+
+@pytest.mark.asyncio
+async def test_snapshot_drops_covered_segments(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), segment_max_bytes=64)
+    wal.load()
+    for i in range(1, 11):
+        wal.append(i, [LogEntry(1, f'cmd{i}'.encode() * 4)])
+    await wal.save_snapshot(8, 1, {"locks": {}})
+    wal.close()
+
+    _, snapshot, entries = WriteAheadLog(str(tmp_path)).load()
+
+    assert snapshot['index'] == 8
+    assert entries == [LogEntry(1, b'cmd9' * 4), LogEntry(1, b'cmd10' * 4)]
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(WriteAheadLog.SEGMENT_SUFFIX)]) < 10
+
+@pytest.mark.asyncio
+async def test_sync_is_shared_by_concurrent_writers(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.load()
+    wal.append(1, [LogEntry(1, b'a')])
+    wal.append(2, [LogEntry(1, b'b')])
+
+    with patch('src.consensus.wal.os.fsync') as fsync:
+        await asyncio.gather(*[wal.sync() for _ in range(5)])
+        assert fsync.call_count == 1
+        assert wal._synced_seq == wal._written_seq
+
+        await wal.sync()
+        assert fsync.call_count == 1
+    wal.close()
+
+@pytest.mark.asyncio
+async def test_meta_and_snapshot_writes_run_off_the_event_loop(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.load()
+    threads = []
+    write_json_atomic = wal._write_json_atomic
+
+    def record_thread(name, data):
+        threads.append(threading.current_thread())
+        write_json_atomic(name, data)
+
+    wal._write_json_atomic = record_thread
+    await asyncio.gather(wal.save_meta(4, 'n3'), wal.save_snapshot(0, 0, {"locks": {}}))
+    wal.close()
+
+    assert threads and threading.main_thread() not in threads
+    meta, snapshot, _ = WriteAheadLog(str(tmp_path)).load()
+    assert meta == {'term': 4, 'voted_for': 'n3'}
+    assert snapshot['data'] == {"locks": {}}